@@ -1,4 +1,10 @@
 import copy
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional: enables the vectorized "numpy" decryption engine
 
 class AES:
     rounds_by_key_size = {16: 10, 24: 12, 32: 14}
@@ -51,6 +57,12 @@ class AES:
         self._add_round_key(cipher_state, self._key_matrices[0])
         return self._matrix_to_bytes(cipher_state)
 
+    def encrypt_words(self, s0, s1, s2, s3):
+        return struct.unpack(">4I", self.encrypt_block(struct.pack(">4I", s0, s1, s2, s3)))
+
+    def decrypt_words(self, s0, s1, s2, s3):
+        return struct.unpack(">4I", self.decrypt_block(struct.pack(">4I", s0, s1, s2, s3)))
+
     def _bytes_to_matrix(self, text):
         return [list(text[i:i+4]) for i in range(0, len(text), 4)]
 
@@ -155,39 +167,302 @@ class AES:
         0xD4, 0xB3, 0x7D, 0xFA, 0xEF, 0xC5, 0x91, 0x39,
     )
 
-def encrypt_cbc(data, key, iv):
-    aes = AES(key)
-    # PCKS7 Padding
-    pad_len = 16 - (len(data) % 16)
-    data += bytes([pad_len] * pad_len)
-    
-    encrypted = []
-    prev = iv
-    for i in range(0, len(data), 16):
-        block = data[i:i+16]
-        # XOR with prev (CBC)
-        xor_block = bytes(a ^ b for a, b in zip(block, prev))
-        enc_block = aes.encrypt_block(xor_block)
-        encrypted.append(enc_block)
-        prev = enc_block
-    return b"".join(encrypted)
-
-def decrypt_cbc(data, key, iv):
-    aes = AES(key)
-    decrypted = []
-    prev = iv
-    
-    for i in range(0, len(data), 16):
-        block = data[i:i+16]
-        dec_block = aes.decrypt_block(block)
-        # XOR with prev (CBC)
-        plain_block = bytes(a ^ b for a, b in zip(dec_block, prev))
-        decrypted.append(plain_block)
-        prev = block
-        
-    out = b"".join(decrypted)
-    # PKCS7 Unpadding
-    pad_len = out[-1]
-    if pad_len < 1 or pad_len > 16:
-        raise ValueError("Invalid padding")
-    return out[:-pad_len]
+def _gmul(a, b):
+    # Multiplication in GF(2^8), only used while building the lookup tables
+    p = 0
+    while b:
+        if b & 1:
+            p ^= a
+        a = (((a << 1) ^ 0x1B) & 0xFF) if (a & 0x80) else (a << 1)
+        b >>= 1
+    return p
+
+def _ror8(word):
+    return ((word >> 8) | (word << 24)) & 0xFFFFFFFF
+
+def _build_tables():
+    # Te*: SubBytes + ShiftRows + MixColumns fused into one 32-bit lookup per byte.
+    # Td*: InvSubBytes + InvShiftRows + InvMixColumns, same idea for decryption.
+    te0, td0 = [], []
+    for x in range(256):
+        s = AES._s_box[x]
+        te0.append((_gmul(s, 2) << 24) | (s << 16) | (s << 8) | _gmul(s, 3))
+        si = AES._inv_s_box[x]
+        td0.append((_gmul(si, 14) << 24) | (_gmul(si, 9) << 16) | (_gmul(si, 13) << 8) | _gmul(si, 11))
+    te1 = [_ror8(w) for w in te0]
+    te2 = [_ror8(w) for w in te1]
+    te3 = [_ror8(w) for w in te2]
+    td1 = [_ror8(w) for w in td0]
+    td2 = [_ror8(w) for w in td1]
+    td3 = [_ror8(w) for w in td2]
+    return (tuple(te0), tuple(te1), tuple(te2), tuple(te3)), (tuple(td0), tuple(td1), tuple(td2), tuple(td3))
+
+_TE, _TD = _build_tables()
+
+# Word-oriented AES: same key schedule and output as the reference class, but each
+# round is 16 table lookups + XORs on four integer column words instead of
+# per-byte list operations.
+class TTableAES(AES):
+    def __init__(self, master_key):
+        super().__init__(master_key)
+        # Round keys as 4 big-endian column words per round
+        self._enc_keys = [
+            [int.from_bytes(bytes(col), "big") for col in round_key]
+            for round_key in self._key_matrices
+        ]
+        # Equivalent inverse cipher: middle round keys go through InvMixColumns
+        td0, td1, td2, td3 = _TD
+        sbox = self._s_box
+        dec_keys = [list(self._enc_keys[-1])]
+        for round_key in self._enc_keys[-2:0:-1]:
+            dec_keys.append([
+                td0[sbox[w >> 24]] ^ td1[sbox[(w >> 16) & 0xFF]] ^
+                td2[sbox[(w >> 8) & 0xFF]] ^ td3[sbox[w & 0xFF]]
+                for w in round_key
+            ])
+        dec_keys.append(list(self._enc_keys[0]))
+        self._dec_keys = dec_keys
+
+    def encrypt_block(self, plaintext):
+        assert len(plaintext) == 16
+        return struct.pack(">4I", *self.encrypt_words(*struct.unpack(">4I", plaintext)))
+
+    def decrypt_block(self, ciphertext):
+        assert len(ciphertext) == 16
+        return struct.pack(">4I", *self.decrypt_words(*struct.unpack(">4I", ciphertext)))
+
+    def encrypt_words(self, s0, s1, s2, s3):
+        te0, te1, te2, te3 = _TE
+        keys = self._enc_keys
+        k0, k1, k2, k3 = keys[0]
+        s0 ^= k0
+        s1 ^= k1
+        s2 ^= k2
+        s3 ^= k3
+        for k0, k1, k2, k3 in keys[1:-1]:
+            s0, s1, s2, s3 = (
+                te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ k0,
+                te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ k1,
+                te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ k2,
+                te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ k3,
+            )
+        # Final round has no MixColumns: plain S-box lookups
+        sbox = self._s_box
+        k0, k1, k2, k3 = keys[-1]
+        return (
+            ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16) | (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ k0,
+            ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16) | (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ k1,
+            ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16) | (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ k2,
+            ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16) | (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ k3,
+        )
+
+    def decrypt_words(self, s0, s1, s2, s3):
+        td0, td1, td2, td3 = _TD
+        keys = self._dec_keys
+        k0, k1, k2, k3 = keys[0]
+        s0 ^= k0
+        s1 ^= k1
+        s2 ^= k2
+        s3 ^= k3
+        for k0, k1, k2, k3 in keys[1:-1]:
+            s0, s1, s2, s3 = (
+                td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ k0,
+                td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ k1,
+                td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ k2,
+                td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ k3,
+            )
+        inv = self._inv_s_box
+        k0, k1, k2, k3 = keys[-1]
+        return (
+            ((inv[s0 >> 24] << 24) | (inv[(s3 >> 16) & 0xFF] << 16) | (inv[(s2 >> 8) & 0xFF] << 8) | inv[s1 & 0xFF]) ^ k0,
+            ((inv[s1 >> 24] << 24) | (inv[(s0 >> 16) & 0xFF] << 16) | (inv[(s3 >> 8) & 0xFF] << 8) | inv[s2 & 0xFF]) ^ k1,
+            ((inv[s2 >> 24] << 24) | (inv[(s1 >> 16) & 0xFF] << 16) | (inv[(s0 >> 8) & 0xFF] << 8) | inv[s3 & 0xFF]) ^ k2,
+            ((inv[s3 >> 24] << 24) | (inv[(s2 >> 16) & 0xFF] << 16) | (inv[(s1 >> 8) & 0xFF] << 8) | inv[s0 & 0xFF]) ^ k3,
+        )
+
+class NumpyAES(TTableAES):
+    # T-table engine that can also run the inverse rounds on many blocks at once.
+    # CBC decryption is parallel across blocks (each plaintext block only needs
+    # two ciphertext blocks), so the whole ciphertext is decrypted as one
+    # (n, 4) uint32 array with table lookups and XOR on arrays.
+    # Encryption is inherently serial in CBC and uses the scalar T-table path.
+    min_batch_blocks = 8
+
+    def __init__(self, master_key):
+        if np is None:
+            raise RuntimeError("NumPy is not installed.")
+        super().__init__(master_key)
+        self._np_td = [np.array(t, dtype=np.uint32) for t in _TD]
+        self._np_inv_s_box = np.array(self._inv_s_box, dtype=np.uint32)
+        self._np_dec_keys = np.array(self._dec_keys, dtype=np.uint32)
+
+    def decrypt_blocks(self, blocks):
+        td0, td1, td2, td3 = self._np_td
+        inv = self._np_inv_s_box
+        keys = self._np_dec_keys
+        state = blocks ^ keys[0]
+        s0, s1, s2, s3 = state[:, 0], state[:, 1], state[:, 2], state[:, 3]
+        for k0, k1, k2, k3 in keys[1:-1]:
+            s0, s1, s2, s3 = (
+                td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ k0,
+                td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ k1,
+                td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ k2,
+                td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ k3,
+            )
+        k0, k1, k2, k3 = keys[-1]
+        return np.stack((
+            ((inv[s0 >> 24] << 24) | (inv[(s3 >> 16) & 0xFF] << 16) | (inv[(s2 >> 8) & 0xFF] << 8) | inv[s1 & 0xFF]) ^ k0,
+            ((inv[s1 >> 24] << 24) | (inv[(s0 >> 16) & 0xFF] << 16) | (inv[(s3 >> 8) & 0xFF] << 8) | inv[s2 & 0xFF]) ^ k1,
+            ((inv[s2 >> 24] << 24) | (inv[(s1 >> 16) & 0xFF] << 16) | (inv[(s0 >> 8) & 0xFF] << 8) | inv[s3 & 0xFF]) ^ k2,
+            ((inv[s3 >> 24] << 24) | (inv[(s2 >> 16) & 0xFF] << 16) | (inv[(s1 >> 8) & 0xFF] << 8) | inv[s0 & 0xFF]) ^ k3,
+        ), axis=1)
+
+# Selectable block engines. "reference" is the original byte-matrix implementation,
+# kept for cross-checking; "ttable" gives identical output and is the default.
+ENGINES = {
+    "reference": AES,
+    "ttable": TTableAES,
+}
+if np is not None:
+    ENGINES["numpy"] = NumpyAES
+DEFAULT_ENGINE = "numpy" if np is not None else "ttable"
+
+def new(key, engine=None):
+    name = engine or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown AES engine: {name}")
+    return ENGINES[name](key)
+
+class CBC:
+    # Holds one expanded key schedule. Create it once per key and ask it for a
+    # fresh encryptor/decryptor per message instead of re-running _expand_key.
+    def __init__(self, key, engine=None):
+        self._aes = new(key, engine)
+
+    def encryptor(self, iv):
+        return CBCEncryptor(self._aes, iv)
+
+    def decryptor(self, iv):
+        return CBCDecryptor(self._aes, iv)
+
+class _CBCContext:
+    # Streaming CBC: update() accepts chunks of any size and returns the bytes
+    # of every block that can be processed so far, finalize() handles padding.
+    _hold_back = False
+
+    def __init__(self, aes, iv):
+        if len(iv) != 16:
+            raise ValueError("IV must be 16 bytes.")
+        self._aes = aes
+        self._prev = struct.unpack(">4I", iv)
+        self._buffer = bytearray()
+        self._finalized = False
+
+    def update(self, data):
+        if self._finalized:
+            raise ValueError("Context was already finalized.")
+        view = memoryview(data).cast("B")
+        buf = self._buffer
+        total = len(buf) + len(view)
+        limit = total - (total % 16)
+        # The decryptor keeps the last whole block back: it carries the padding
+        if self._hold_back and limit == total:
+            limit -= 16
+        if limit <= 0:
+            buf += view
+            return b""
+
+        out = []
+        start = 0
+        if buf:
+            # Complete the pending block before working on the new data directly
+            start = (16 - len(buf) % 16) % 16
+            buf += view[:start]
+            out.append(self._process(buf))
+        end = limit - (len(buf) if buf else 0) + start
+        if end > start:
+            out.append(self._process(view[start:end]))
+        self._buffer = bytearray(view[end:])
+        return b"".join(out)
+
+    def _process(self, chunk):
+        raise NotImplementedError
+
+class CBCEncryptor(_CBCContext):
+    def _process(self, chunk):
+        n = len(chunk) // 4
+        words = struct.unpack(f">{n}I", chunk)
+        encrypt = self._aes.encrypt_words
+        p0, p1, p2, p3 = self._prev
+        out = []
+        for i in range(0, n, 4):
+            # XOR with prev (CBC)
+            p0, p1, p2, p3 = encrypt(words[i] ^ p0, words[i + 1] ^ p1, words[i + 2] ^ p2, words[i + 3] ^ p3)
+            out += (p0, p1, p2, p3)
+        self._prev = (p0, p1, p2, p3)
+        return struct.pack(f">{n}I", *out)
+
+    def finalize(self):
+        if self._finalized:
+            raise ValueError("Context was already finalized.")
+        self._finalized = True
+        # PKCS7 Padding
+        pad_len = 16 - len(self._buffer)
+        self._buffer += bytes([pad_len] * pad_len)
+        out = self._process(self._buffer)
+        self._buffer = bytearray()
+        return out
+
+class CBCDecryptor(_CBCContext):
+    _hold_back = True
+
+    def _process(self, chunk):
+        batch = getattr(self._aes, "decrypt_blocks", None)
+        if batch is not None and len(chunk) >= 16 * self._aes.min_batch_blocks:
+            return self._process_batch(chunk, batch)
+
+        n = len(chunk) // 4
+        words = struct.unpack(f">{n}I", chunk)
+        decrypt = self._aes.decrypt_words
+        p0, p1, p2, p3 = self._prev
+        out = []
+        for i in range(0, n, 4):
+            c0, c1, c2, c3 = words[i:i + 4]
+            d0, d1, d2, d3 = decrypt(c0, c1, c2, c3)
+            # XOR with prev (CBC)
+            out += (d0 ^ p0, d1 ^ p1, d2 ^ p2, d3 ^ p3)
+            p0, p1, p2, p3 = c0, c1, c2, c3
+        self._prev = (p0, p1, p2, p3)
+        return struct.pack(f">{n}I", *out)
+
+    def _process_batch(self, chunk, decrypt_blocks):
+        blocks = np.frombuffer(chunk, dtype=">u4").astype(np.uint32).reshape(-1, 4)
+        # Block i is XORed with ciphertext block i-1 (the IV / previous chunk for i=0)
+        prev = np.empty_like(blocks)
+        prev[0] = self._prev
+        prev[1:] = blocks[:-1]
+        out = decrypt_blocks(blocks) ^ prev
+        self._prev = tuple(int(w) for w in blocks[-1])
+        return out.astype(">u4").tobytes()
+
+    def finalize(self):
+        if self._finalized:
+            raise ValueError("Context was already finalized.")
+        self._finalized = True
+        if len(self._buffer) != 16:
+            raise ValueError("Ciphertext length must be a multiple of 16 bytes.")
+        last = self._process(self._buffer)
+        self._buffer = bytearray()
+        # PKCS7 Unpadding
+        pad_len = last[-1]
+        if pad_len < 1 or pad_len > 16 or last[-pad_len:] != bytes([pad_len] * pad_len):
+            raise ValueError("Invalid padding")
+        return last[:-pad_len]
+
+def encrypt_cbc(data, key, iv, engine=None):
+    encryptor = CBC(key, engine).encryptor(iv)
+    return encryptor.update(data) + encryptor.finalize()
+
+def decrypt_cbc(data, key, iv, engine=None):
+    decryptor = CBC(key, engine).decryptor(iv)
+    return decryptor.update(data) + decryptor.finalize()
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import time
+import platform
+
+# Single place that decides which Fernet implementation the app uses.
+# Every frontend (main.App, gui.PasswordManagerGUI, webapp.py) goes through
+# get_fernet() instead of keeping its own try/except import fallback.
+
+# Force a specific backend (e.g. for benchmarking): CRED_MANAGER_BACKEND=pure-ttable
+ENV_OVERRIDE = "CRED_MANAGER_BACKEND"
+CACHE_PATH = "backend_cache.json"
+
+_registry = {}
+_selected = None
+
+def register(name, loader):
+    # loader() returns a Fernet-compatible class or raises ImportError when unavailable
+    _registry[name] = loader
+
+def _load_cryptography():
+    from cryptography.fernet import Fernet
+    return Fernet
+
+def _pure_fernet(engine):
+    from . import pure_fernet
+    return type("Fernet", (pure_fernet.Fernet,), {"engine": engine})
+
+register("cryptography", _load_cryptography)
+
+def available():
+    backends = {}
+    for name, loader in _registry.items():
+        try:
+            backends[name] = loader()
+        except ImportError:
+            continue
+    # Every AES engine in libs.aes (reference, ttable, numpy when installed, and any
+    # engine added there later) is offered as its own pure-python backend.
+    from . import aes
+    for engine in aes.ENGINES:
+        backends.setdefault(f"pure-{engine}", _pure_fernet(engine))
+    return backends
+
+def calibrate(backends, payload_size=4096, rounds=3):
+    # Tiny encrypt + decrypt benchmark; returns seconds per round for each backend
+    data = os.urandom(payload_size)
+    timings = {}
+    for name, cls in backends.items():
+        f = cls(cls.generate_key())
+        start = time.perf_counter()
+        for _ in range(rounds):
+            f.decrypt(f.encrypt(data))
+        timings[name] = (time.perf_counter() - start) / rounds
+    return timings
+
+def _fingerprint(names):
+    return f"{sys.version_info[0]}.{sys.version_info[1]}|{platform.machine()}|{','.join(sorted(names))}"
+
+def select(cache_path=CACHE_PATH, recalibrate=False):
+    backends = available()
+    if not backends:
+        raise ImportError("No Fernet backend available. Please run 'pip install -r requirements.txt'")
+
+    forced = os.environ.get(ENV_OVERRIDE)
+    if forced:
+        if forced not in backends:
+            raise ImportError(f"{ENV_OVERRIDE}={forced} is not available (have: {', '.join(backends)})")
+        return forced, backends[forced]
+
+    fingerprint = _fingerprint(backends)
+    if not recalibrate and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint and cached.get("selected") in backends:
+                return cached["selected"], backends[cached["selected"]]
+        except (OSError, ValueError):
+            pass
+
+    timings = calibrate(backends)
+    name = min(timings, key=timings.get)
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump({"fingerprint": fingerprint, "selected": name, "timings": timings}, f, indent=4)
+    except OSError:
+        pass  # Read-only install: just calibrate again next start
+    return name, backends[name]
+
+def get_fernet():
+    global _selected
+    if _selected is None:
+        _selected = select()
+    return _selected[1]
+
+def selected_name():
+    get_fernet()
+    return _selected[0]
@@ -3,55 +3,590 @@ import json
 import random
 import datetime
 import getpass
-from . import pure_fernet
+import hashlib
+import pathlib
+import queue
+import subprocess
+import threading
+from . import backends
 from . import pure_otp
-
-# Try standard imports, fallback to locals is handled by the importer of this module usually, 
-# but core.py needs to be robust. 
-# Actually, since we are in 'libs', we should check if we can import from standard 
-# or if we should use the sibling modules.
-# For simplicity, we assume the environment is set up (standard or local).
-# But wait, main.py did the patching.
-# We will replicate the import logic here to be safe, or assume main.py patches it? 
-# Better to be explicit:
+from . import session
+from . import vault
 
 try:
     import pyotp
     import qrcode
-    from cryptography.fernet import Fernet
 except ImportError:
     from . import pure_otp as pyotp
-    from . import pure_fernet as Fernet
     qrcode = None
 
+# Shared backend registry picks the Fernet implementation (see libs/backends.py).
+# Resolved on first use (backends.get_fernet()), so importing this module never
+# runs the calibration or writes backend_cache.json.
+
+# Local record of what the last successful sync saw (never committed)
+SYNC_STATE_PATH = "sync_state.json"
+
+# One git run at a time in this process: auto-sync timers, background runners and
+# the CLI all take it, so two syncs never race on index.lock or a half-done merge
+SYNC_LOCK = threading.RLock()
+
+# History retention for GitSync.compact (pm_config.json: "sync_keep_days",
+# "sync_checkpoint_days", "sync_keep_checkpoints"): every sync of the last 30
+# days, then one checkpoint per week for a year; anything older is dropped.
+DEFAULT_KEEP_DAYS = 30
+DEFAULT_CHECKPOINT_DAYS = 7
+DEFAULT_KEEP_CHECKPOINTS = 52
+# Commit subjects written by GitSync.push and GitSync.compact
+SYNC_SUBJECTS = ("Auto-Sync: ", "Sync checkpoint: ")
+
+SUCCESS_MESSAGES = {
+    "push": "Data uploaded.",
+    "pull": "Data updated.",
+    "compact": "Sync history compacted.",
+    "clone": "Vault folder cloned.",
+}
+
+class SyncResult:
+    # Outcome of one sync: `step` is the git command that failed (None on success);
+    # `skipped` means nothing changed since the last sync, so git was not run.
+    def __init__(self, action, ok, returncode=0, stderr="", step=None, skipped=False):
+        self.action = action
+        self.ok = ok
+        self.returncode = returncode
+        self.stderr = stderr
+        self.step = step
+        self.skipped = skipped
+
+    def message(self):
+        if self.skipped:
+            return "Nothing to compact." if self.action == "compact" else "No changes to upload."
+        if self.ok:
+            return SUCCESS_MESSAGES.get(self.action, "Done.")
+        detail = self.stderr.strip().splitlines()[-1] if self.stderr.strip() else f"exit code {self.returncode}"
+        return f"git {self.step} failed: {detail}"
+
 class GitSync:
     @staticmethod
-    def push_data():
-        print("Syncing: Uploading changes to Cloud (Git)...")
+    def git(*args, cwd=None, env=None):
+        # Output is captured, and git may not prompt for credentials: a sync running
+        # in the background must fail instead of waiting on an invisible terminal.
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0", **(env or {}))
+        return subprocess.run(["git", *args], cwd=cwd, env=env, capture_output=True, text=True)
+
+    @staticmethod
+    def expand(paths):
+        # Files to track: directories (vault shards, delta change sets) are walked, missing paths dropped
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    files.extend(os.path.join(root, name) for name in sorted(names))
+            elif os.path.exists(path):
+                files.append(path)
+        return files
+
+    @staticmethod
+    def fingerprint(paths, state_path=SYNC_STATE_PATH):
+        # {path: [size, mtime_ns, sha256]}. Files whose size and mtime match the saved
+        # state reuse its hash, so checking an unchanged vault reads no file content.
+        saved = GitSync.load_state(state_path).get("files", {})
+        files = {}
+        for path in GitSync.expand(paths):
+            st = os.stat(path)
+            known = saved.get(path)
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+                files[path] = known
+                continue
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            files[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        return files
+
+    @staticmethod
+    def load_state(state_path=SYNC_STATE_PATH):
         try:
-            # Stage everything
-            os.system("git add .")
-            # Commit
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            os.system(f'git commit -m "Auto-Sync: {timestamp}"')
-            # Push
-            if os.system("git push") == 0:
-                print("Success: Data uploaded.")
-            else:
-                print("Error: Push failed. Check your internet or git config.")
-        except Exception as e:
-            print(f"Sync Error: {e}")
+            with open(state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def save_state(files, state_path=SYNC_STATE_PATH):
+        with open(state_path, 'w') as f:
+            json.dump({"files": files}, f, indent=4)
+
+    @staticmethod
+    def changed(files, state_path=SYNC_STATE_PATH):
+        saved = GitSync.load_state(state_path).get("files")
+        if saved is None:
+            return True
+        return {p: v[2] for p, v in files.items()} != {p: v[2] for p, v in saved.items()}
+
+    @staticmethod
+    def push(progress=None, cwd=None, paths=None, state_path=SYNC_STATE_PATH, watch=None):
+        # progress(message) is called before each step; returns a SyncResult.
+        # With `paths` (vault files, see ConfigManager.sync_paths) only those are
+        # staged, and nothing runs when they and the `watch` files (never staged,
+        # see ConfigManager.watch_paths) match the last sync.
+        vault.flush_buffers() # write-behind changes must be on disk first
+        files = None
+        add = ["add", "."]
+        if paths is not None:
+            state_path = os.path.join(cwd, state_path) if cwd else state_path
+            paths = [os.path.join(cwd, p) if cwd else p for p in paths]
+            watch = [os.path.join(cwd, p) if cwd else p for p in watch or ()]
+            files = GitSync.fingerprint(paths + watch, state_path)
+            if not GitSync.changed(files, state_path):
+                return SyncResult("push", True, skipped=True)
+            existing = [p for p in paths if os.path.exists(p)]
+            if not existing:
+                # An empty pathspec would stage the whole working tree
+                return SyncResult("push", False, -1, "None of the sync paths exist.", "add")
+            # -A also stages deletions inside tracked paths (removed shards)
+            add = ["add", "-A", "--"] + existing
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        steps = [
+            ("Staging changes...", add),
+            ("Committing...", ["commit", "-m", f"Auto-Sync: {timestamp}"]),
+            ("Pushing to remote...", ["push"]),
+        ]
+        for message, args in steps:
+            try:
+                if args[0] == "commit":
+                    staged = GitSync.git("diff", "--cached", "--quiet", cwd=cwd)
+                    if staged.returncode == 0:
+                        continue # nothing new staged: still push anything committed earlier
+                    if staged.returncode != 1:
+                        return SyncResult("push", False, staged.returncode, staged.stderr, "diff")
+                if progress:
+                    progress(message)
+                proc = GitSync.git(*args, cwd=cwd)
+            except OSError as e:
+                return SyncResult("push", False, -1, str(e), args[0])
+            if proc.returncode != 0:
+                return SyncResult("push", False, proc.returncode, proc.stderr or proc.stdout, args[0])
+        if files is not None:
+            GitSync.save_state(files, state_path)
+        return SyncResult("push", True)
+
+    @staticmethod
+    def pull(progress=None, cwd=None, paths=None, state_path=SYNC_STATE_PATH, watch=None):
+        # Pending write-behind changes go to disk first: git then merges them (or
+        # refuses to overwrite them) instead of a later flush rewriting the pulled vault
+        vault.flush_buffers()
+        clean = False
+        if paths is not None:
+            # Only a pull that starts with nothing local to send may mark the files synced
+            try:
+                status = GitSync.git("status", "--porcelain", "--", *paths, cwd=cwd)
+                clean = status.returncode == 0 and not status.stdout.strip()
+            except OSError:
+                pass
+        if progress:
+            progress("Pulling from remote...")
+        try:
+            proc = GitSync.git("pull", cwd=cwd)
+        except OSError as e:
+            return SyncResult("pull", False, -1, str(e), "pull")
+        if proc.returncode != 0:
+            return SyncResult("pull", False, proc.returncode, proc.stderr or proc.stdout, "pull")
+        if clean:
+            # In step with the remote (no commit left from a failed push): the
+            # next push has nothing to send
+            heads = GitSync.git("rev-parse", "HEAD", "@{u}", cwd=cwd).stdout.split()
+            if len(heads) == 2 and heads[0] == heads[1]:
+                state_path = os.path.join(cwd, state_path) if cwd else state_path
+                paths = [os.path.join(cwd, p) if cwd else p for p in list(paths) + list(watch or ())]
+                GitSync.save_state(GitSync.fingerprint(paths, state_path), state_path)
+        return SyncResult("pull", True)
+
+    # History maintenance. Every sync commits a full copy of the encrypted vault,
+    # which git cannot delta-compress, so clones grow with every save.
+    @staticmethod
+    def history(cwd=None):
+        # Commits along first parents, oldest first, as dicts with commit, tree,
+        # time, parents, author, email, message and files (paths it changed)
+        fmt = "%x01%H%x00%T%x00%ct%x00%P%x00%an%x00%ae%x00%B%x02"
+        proc = GitSync.git("log", "--first-parent", "--reverse", "--name-only", f"--format={fmt}", cwd=cwd)
+        if proc.returncode != 0:
+            return None
+        commits = []
+        for chunk in proc.stdout.split("\x01")[1:]:
+            header, names = chunk.split("\x02", 1)
+            commit, tree, ctime, parents, author, email, message = header.split("\x00", 6)
+            commits.append({"commit": commit, "tree": tree, "time": int(ctime), "parents": parents.split(),
+                            "author": author, "email": email, "message": message.strip(),
+                            "files": [name for name in names.splitlines() if name]})
+        return commits
+
+    @staticmethod
+    def is_sync_commit(commit, paths=None):
+        # Written by push() (or a previous compaction), one parent, and only
+        # touching the synced files (`paths`, relative to the repository)
+        if len(commit["parents"]) != 1 or not commit["message"].startswith(SYNC_SUBJECTS):
+            return False
+        if paths is None:
+            return True
+        roots = [p.replace(os.sep, "/").rstrip("/") for p in paths]
+        return all(any(name == root or name.startswith(root + "/") for root in roots) for name in commit["files"])
+
+    @staticmethod
+    def retention(commits, keep_days=DEFAULT_KEEP_DAYS, checkpoint_days=DEFAULT_CHECKPOINT_DAYS,
+                  keep_checkpoints=DEFAULT_KEEP_CHECKPOINTS, now=None):
+        # The commits to keep: all newer than keep_days, plus the last commit of each
+        # checkpoint_days window before that (only the newest keep_checkpoints
+        # windows). The current commit is always kept.
+        now = datetime.datetime.now().timestamp() if now is None else now
+        cutoff = now - keep_days * 86400
+        windows = {}
+        for commit in commits:
+            if commit["time"] < cutoff:
+                windows[int(commit["time"] // (checkpoint_days * 86400))] = commit
+        keep = {windows[w]["commit"] for w in sorted(windows)[-keep_checkpoints:]} if keep_checkpoints > 0 else set()
+        keep.update(commit["commit"] for commit in commits if commit["time"] >= cutoff)
+        if commits:
+            keep.add(commits[-1]["commit"])
+        return [commit for commit in commits if commit["commit"] in keep]
+
+    @staticmethod
+    def compact(progress=None, cwd=None, paths=None, keep_days=DEFAULT_KEEP_DAYS, checkpoint_days=DEFAULT_CHECKPOINT_DAYS,
+                keep_checkpoints=DEFAULT_KEEP_CHECKPOINTS, aggressive=False, now=None):
+        # Only the run of sync commits (see is_sync_commit) after the newest other
+        # commit is rewritten: that commit and everything before it keep their ids.
+        # The retained syncs keep their snapshot, author, date and message; a
+        # checkpoint stands in for the syncs squashed into it. The branch is
+        # force-pushed if the remote still has the history we rewrote, then the
+        # branch's reflogs are expired and the repository repacked so the dropped
+        # vault copies leave the local object store (unless a stash or another
+        # branch still holds them).
+        # Other devices must re-clone (bootstrap) or `git fetch` + `git reset --hard @{u}`.
+        def run(message, *args, env=None):
+            if progress and message:
+                progress(message)
+            try:
+                return GitSync.git(*args, cwd=cwd, env=env)
+            except OSError as e:
+                return subprocess.CompletedProcess(args, -1, "", str(e))
+
+        def failed(proc, step):
+            return SyncResult("compact", False, proc.returncode, proc.stderr or proc.stdout, step)
+
+        upstream = run(None, "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}")
+        remote = branch = None
+        if upstream.returncode == 0:
+            remote, branch = upstream.stdout.strip().split("/", 1)
+            proc = run("Fetching remote...", "fetch", remote)
+            if proc.returncode != 0:
+                return failed(proc, "fetch")
+            heads = run(None, "rev-parse", "HEAD", "@{u}").stdout.split()
+            if len(heads) != 2 or heads[0] != heads[1]:
+                return SyncResult("compact", False, -1, "Local and remote history differ: push or pull first.", "fetch")
+
+        commits = GitSync.history(cwd)
+        if commits is None:
+            return failed(run(None, "log", "-1"), "log")
+        start = len(commits)
+        while start > 0 and GitSync.is_sync_commit(commits[start - 1], paths):
+            start -= 1
+        base = commits[start - 1]["commit"] if start > 0 else None
+        syncs = commits[start:]
+        kept = GitSync.retention(syncs, keep_days, checkpoint_days, keep_checkpoints, now)
+        if len(kept) == len(syncs):
+            return SyncResult("compact", True, skipped=True)
+
+        if progress:
+            progress(f"Squashing {len(syncs)} sync commits into {len(kept)}...")
+        cutoff = (datetime.datetime.now().timestamp() if now is None else now) - keep_days * 86400
+        position = {commit["commit"]: i for i, commit in enumerate(syncs)}
+        parent = base
+        previous = -1
+        for commit in kept:
+            squashed = position[commit["commit"]] - previous
+            previous = position[commit["commit"]]
+            message = commit["message"]
+            if commit["time"] < cutoff and squashed > 1:
+                day = datetime.datetime.fromtimestamp(commit["time"]).strftime("%Y-%m-%d")
+                message = f"Sync checkpoint: {day} ({squashed} syncs)"
+            date = f"{commit['time']} +0000"
+            env = {"GIT_AUTHOR_NAME": commit["author"], "GIT_AUTHOR_EMAIL": commit["email"],
+                   "GIT_AUTHOR_DATE": date, "GIT_COMMITTER_DATE": date}
+            args = ["commit-tree", commit["tree"], "-m", message] + (["-p", parent] if parent else [])
+            proc = run(None, *args, env=env)
+            if proc.returncode != 0:
+                return failed(proc, "commit-tree")
+            parent = proc.stdout.strip()
+
+        # Same tree as before, so the index and working files stay as they are
+        old_head = commits[-1]["commit"]
+        proc = run(None, "reset", "-q", "--soft", parent)
+        if proc.returncode != 0:
+            return failed(proc, "reset")
+        if remote:
+            proc = run("Pushing compacted history...", "push", f"--force-with-lease={branch}:{old_head}", remote, f"HEAD:{branch}")
+            if proc.returncode != 0:
+                run(None, "reset", "-q", "--soft", old_head) # remote changed meanwhile: keep the full history
+                return failed(proc, "push")
+        # Only the reflogs that still point at the old history: others (refs/stash,
+        # other branches) are the user's and keep what they reference
+        refs = ["HEAD"]
+        local = run(None, "symbolic-ref", "-q", "HEAD").stdout.strip()
+        if local:
+            refs.append(local)
+        if remote:
+            refs.append(f"refs/remotes/{remote}/{branch}")
+        steps = [
+            ("Expiring reflog...", ["reflog", "expire", "--expire=now", "--expire-unreachable=now"] + refs),
+            ("Repacking...", ["gc", "--prune=now"] + (["--aggressive"] if aggressive else [])),
+        ]
+        for message, args in steps:
+            proc = run(message, *args)
+            if proc.returncode != 0:
+                return failed(proc, args[0])
+        return SyncResult("compact", True)
+
+    @staticmethod
+    def bootstrap(url, dest, depth=1, progress=None):
+        # New device: clone only the latest `depth` commits of the synced branch.
+        # Push and pull work as usual from a shallow clone.
+        if os.path.isdir(url):
+            url = pathlib.Path(url).resolve().as_uri() # --depth is ignored for plain local paths
+        if progress:
+            progress("Cloning vault folder...")
+        args = ["clone", "--single-branch"] + (["--depth", str(depth)] if depth else []) + [url, dest]
+        try:
+            proc = GitSync.git(*args)
+        except OSError as e:
+            return SyncResult("clone", False, -1, str(e), "clone")
+        if proc.returncode != 0:
+            return SyncResult("clone", False, proc.returncode, proc.stderr or proc.stdout, "clone")
+        return SyncResult("clone", True)
 
+    # Blocking versions for the CLI
     @staticmethod
-    def pull_data():
+    def push_data(paths=None, syncer=None, watch=None):
+        print("Syncing: Uploading changes to Cloud (Git)...")
+        with SYNC_LOCK:
+            result = (syncer or GitSync).push(progress=print, paths=paths, watch=watch)
+        if result.skipped:
+            print(result.message())
+        elif result.ok:
+            print("Success: " + result.message())
+        else:
+            print("Error: Push failed. Check your internet or git config.")
+            print(result.message())
+        return result
+
+    @staticmethod
+    def pull_data(paths=None, syncer=None, watch=None):
         print("Syncing: Downloading changes from Cloud (Git)...")
+        with SYNC_LOCK:
+            result = (syncer or GitSync).pull(progress=print, paths=paths, watch=watch)
+        if result.ok:
+            print("Success: " + result.message())
+        else:
+            print("Error: Pull failed.")
+            print(result.message())
+        return result
+
+    @staticmethod
+    def compact_data(config=None, paths=None, aggressive=False):
+        config = config or {}
+        print("Maintenance: Compacting sync history (Git)...")
+        with SYNC_LOCK:
+            result = GitSync.compact(progress=print, paths=paths,
+                                     keep_days=config.get("sync_keep_days", DEFAULT_KEEP_DAYS),
+                                     checkpoint_days=config.get("sync_checkpoint_days", DEFAULT_CHECKPOINT_DAYS),
+                                     keep_checkpoints=config.get("sync_keep_checkpoints", DEFAULT_KEEP_CHECKPOINTS),
+                                     aggressive=aggressive)
+        if result.skipped:
+            print(result.message())
+        elif result.ok:
+            print("Success: " + result.message())
+            print("Other devices: clone again (python main.py clone <url> <folder>) or run")
+            print("'git fetch' and 'git reset --hard @{u}' there after pushing their changes.")
+        else:
+            print("Error: Compaction failed.")
+            print(result.message())
+        return result
+
+    @staticmethod
+    def bootstrap_data(url, dest, depth=1):
+        result = GitSync.bootstrap(url, dest, depth, progress=print)
+        if result.ok:
+            print("Success: " + result.message())
+        else:
+            print("Error: Clone failed.")
+            print(result.message())
+        return result
+
+class SyncRunner:
+    # Runs GitSync on a worker thread so the GUI mainloop and the webapp keep
+    # working during the network round trip. Events are ("progress", message)
+    # and ("done", SyncResult); they are queued for poll() (Tk timers, Streamlit
+    # reruns) and also passed to on_event, which runs on the worker thread.
+    def __init__(self, on_event=None, cwd=None, paths=None, syncer=None):
+        self.on_event = on_event
+        self.cwd = cwd
+        self.syncer = syncer or GitSync # or a delta.DeltaSync
+        self.paths = paths # as for GitSync.push; None stages the whole tree
+        self.watch = None
+        self.result = None
+        self._events = queue.Queue()
+        self._thread = None
+
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def push(self, paths=None, watch=None):
+        return self._start("push", paths, watch)
+
+    def pull(self, paths=None, watch=None):
+        return self._start("pull", paths, watch)
+
+    def _start(self, action, paths=None, watch=None):
+        # Returns False if a sync is already running
+        if self.busy():
+            return False
+        if paths is not None:
+            self.paths = paths
+        if watch is not None:
+            self.watch = watch
+        self.result = None
+        self._thread = threading.Thread(target=self._run, args=(action,), daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, action):
+        run = self.syncer.push if action == "push" else self.syncer.pull
         try:
-            if os.system("git pull") == 0:
-                print("Success: Data updated.")
-            else:
-                print("Error: Pull failed.")
+            with SYNC_LOCK:
+                result = run(progress=lambda message: self._emit("progress", message), cwd=self.cwd, paths=self.paths, watch=self.watch)
         except Exception as e:
-            print(f"Sync Error: {e}")
+            result = SyncResult(action, False, -1, str(e), action)
+        self.result = result
+        self._emit("done", result)
+
+    def _emit(self, kind, payload):
+        self._events.put((kind, payload))
+        if self.on_event:
+            self.on_event(kind, payload)
+
+    def poll(self):
+        # Events since the last poll, oldest first
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def wait(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+        return self.result
+
+class AutoSync:
+    # Opt-in background sync (pm_config.json: "auto_sync": true). notify() after each
+    # vault save; once saves have been quiet for `quiet` seconds they all go out as
+    # one commit and push. A failed push (offline, remote down) is retried after
+    # `retry` seconds, doubling each time up to `max_backoff`. close() pushes
+    # whatever is still pending right away and stops the timers (app exit).
+    # `paths` and `watch` are lists or callables returning one (ConfigManager.sync_paths,
+    # ConfigManager.watch_paths).
+    def __init__(self, paths, quiet=30, retry=15, max_backoff=600, cwd=None, on_event=None, syncer=None, watch=None):
+        self.paths = paths
+        self.watch = watch
+        self.syncer = syncer or GitSync # or a delta.DeltaSync
+        self.quiet = quiet
+        self.retry = retry
+        self.max_backoff = max_backoff
+        self.cwd = cwd
+        self.on_event = on_event
+        self.last_result = None
+        self._pending = False
+        self._failures = 0
+        self._closed = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, cm, on_event=None, syncer=None):
+        # None unless enabled in the config
+        if not cm.config.get("auto_sync"):
+            return None
+        return cls(cm.sync_paths,
+                   watch=cm.watch_paths,
+                   quiet=cm.config.get("auto_sync_quiet", 30),
+                   max_backoff=cm.config.get("auto_sync_max_backoff", 600),
+                   on_event=on_event,
+                   syncer=syncer or cm.syncer())
+
+    def notify(self, names=None):
+        with self._lock:
+            if self._closed:
+                return
+            self._pending = True
+            if self._failures == 0:
+                self._schedule(self.quiet) # every save restarts the quiet period
+            elif self._timer is None:
+                self._schedule(self._backoff())
+
+    def pending(self):
+        return self._pending
+
+    def _backoff(self):
+        return min(self.retry * 2 ** (self._failures - 1), self.max_backoff)
+
+    def _schedule(self, delay):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self):
+        with self._lock:
+            self._timer = None
+        self.sync()
+
+    def sync(self):
+        # Pushes now if anything is pending; returns the SyncResult (None if idle)
+        with SYNC_LOCK:
+            with self._lock:
+                if not self._pending:
+                    return None
+                self._pending = False
+            paths = self.paths() if callable(self.paths) else self.paths
+            watch = self.watch() if callable(self.watch) else self.watch
+            try:
+                result = self.syncer.push(cwd=self.cwd, paths=paths, watch=watch)
+            except Exception as e:
+                result = SyncResult("push", False, -1, str(e), "push")
+            self.last_result = result
+            with self._lock:
+                if result.ok:
+                    self._failures = 0
+                else:
+                    self._pending = True
+                    self._failures += 1
+                    if not self._closed and self._timer is None:
+                        self._schedule(self._backoff())
+            if self.on_event:
+                self.on_event("done", result)
+            return result
+
+    def close(self):
+        # Returns the latest SyncResult (a push that was already running counts)
+        with self._lock:
+            self._closed = True
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        return self.sync() or self.last_result
 
 class RailFence:
     @staticmethod
@@ -144,6 +679,9 @@ class ConfigManager:
         self.key_path = key_path
         self.config = {}
         self.fernet = None
+        self.blind_key = None
+        self._otp_verifier = None
+        self._delta_sync = None
 
     def load(self):
         if not os.path.exists(self.config_path):
@@ -154,13 +692,13 @@ class ConfigManager:
         if os.path.exists(self.key_path):
             with open(self.key_path, 'rb') as k:
                 key = k.read()
-                self.fernet = Fernet(key)
+                self.set_key(key)
         else:
             # Try finding key in current dir if not found at path
             if os.path.exists("key.key"):
                 with open("key.key", 'rb') as k:
                     key = k.read()
-                    self.fernet = Fernet(key)
+                    self.set_key(key)
         return True
 
     def save(self):
@@ -168,7 +706,93 @@ class ConfigManager:
             json.dump(self.config, f, indent=4)
 
     def generate_key(self):
-        key = Fernet.generate_key()
+        key = backends.get_fernet().generate_key()
         with open(self.key_path, 'wb') as k:
             k.write(key)
-        self.fernet = Fernet(key)
+        self.set_key(key)
+
+    def set_key(self, key):
+        self.fernet = backends.get_fernet()(key)
+        # Sub-key for the log vault's name tags (exact lookups without decrypting names)
+        self.blind_key = vault.derive_blind_key(key)
+
+    def vault_options(self):
+        # Keyword arguments for vault.open_vault() from pm_config.json
+        return {
+            "fmt": self.config.get("vault_format"),
+            "blind_key": self.blind_key,
+            "compression": self.config.get("compression"),
+            "level": self.config.get("compression_level"),
+            "serialization": self.config.get("serialization"),
+            "shards": self.config.get("vault_shards"),
+        }
+
+    def syncer(self):
+        # GitSync commits the vault files; "sync_mode": "delta" exchanges change sets
+        # One DeltaSync per key, shared by the sync runner and auto-sync
+        if self.config.get("sync_mode") != "delta":
+            return GitSync
+        if self._delta_sync is None or self._delta_sync.fernet is not self.fernet:
+            from . import delta # imports this module
+            self._delta_sync = delta.DeltaSync(self.open_vault, self.fernet)
+        return self._delta_sync
+
+    def record_edit(self, names=None):
+        # Every vault write: delta sync keeps the edit time (see DeltaSync.touch)
+        if self.config.get("sync_mode") == "delta":
+            self.syncer().touch(names)
+
+    def sync_paths(self):
+        # What a Git sync stages: the vault the session opens (see
+        # resolve_data_path), its shard files and the authenticator store. Local caches (.idx, .journal, sync state), this
+        # config and key.key stay out of the repository history.
+        paths = []
+        for path in (self.resolve_data_path(), self.config.get("authenticator_path", "authenticator.dat")):
+            if path:
+                paths += [path, path + ".shards"]
+        return paths
+
+    def watch_paths(self):
+        # Counted as a change for the next sync but never staged: the config
+        # holds the plaintext otp_secret
+        return [self.config_path]
+
+    def otp_verifier(self):
+        # Cached per secret: base32 decode and window codes are reused across logins
+        secret = self.config.get("otp_secret")
+        if not secret:
+            return None
+        drift = self.config.get("otp_drift", 0)
+        if self._otp_verifier is None or self._otp_verifier.secret_b32 != secret or self._otp_verifier.drift != drift:
+            # Once the clock offset is calibrated a +/-1 step window is enough
+            self._otp_verifier = pure_otp.TOTPVerifier(secret, valid_window=1, drift=drift)
+        return self._otp_verifier
+
+    def open_vault(self, path=None, write=True):
+        return vault.open_vault(path or self.resolve_data_path(), self.fernet, write=write, **self.vault_options())
+
+    def resolve_data_path(self):
+        path = self.config.get("data_path")
+        if path and not os.path.exists(path):
+            # Fallback: a copy of the vault in the current directory
+            local_name = os.path.basename(path)
+            if os.path.exists(local_name):
+                return local_name
+        return path
+
+    def open_session(self, on_change=None):
+        # Decrypts the vault once; raises if the key cannot decrypt it.
+        # on_change(names) runs after each write (see VaultSession)
+        ttl = self.config.get("session_ttl", session.DEFAULT_TTL)
+        store = self.open_vault(self.resolve_data_path())
+        if self.config.get("write_behind", 0) > 0:
+            # Coalesce rapid saves into one rewrite (journaled, flushed on lock/exit)
+            store = vault.BufferedVault(store, self.config["write_behind"])
+        vault_session = session.VaultSession(store, ttl, on_change=on_change)
+        vault_session.unlock()
+        return vault_session
+
+    def open_authenticator(self):
+        # Service TOTP secrets (name -> base32) live in their own encrypted file next to the vault
+        path = self.config.get("authenticator_path", "authenticator.dat")
+        return vault.open_vault(path, self.fernet, **self.vault_options())
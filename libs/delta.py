@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from . import vault
+from .core import GitSync, SyncResult
+
+# Record-level sync (pm_config.json: "sync_mode": "delta"). Instead of committing
+# the vault file, every device commits encrypted change sets:
+#   <changes_dir>/<device id>/<sequence>.cs
+# each holding {"device", "seq", "records": [{"k": name, "v": value | "d": 1, "t": time}]}.
+# A device only ever adds files under its own directory, so `git pull` never
+# conflicts; pulling replays the other devices' new change sets into the local
+# vault with last-writer-wins per service (newest "t", device id breaks ties).
+# The vault file itself stays local (add it to .gitignore on a fresh setup).
+DEFAULT_CHANGES_DIR = "changes"
+# Local, encrypted: device id, next sequence number, applied change sets, the
+# version (time, device, value hash) of every record this device knows and the
+# edit time of local changes not yet in a change set.
+DEFAULT_STATE_PATH = "delta_state.dat"
+
+# The state is re-read under this lock before every change, so instances that
+# share a state file (GUI runner and auto-sync) never reuse a sequence number
+_state_lock = threading.RLock()
+
+def value_digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+class DeltaSync:
+    # open_vault: callable returning the local vault (ConfigManager.open_vault)
+    def __init__(self, open_vault, fernet, repo_dir=None, changes_dir=DEFAULT_CHANGES_DIR, state_path=DEFAULT_STATE_PATH):
+        self.open_vault = open_vault
+        self.fernet = fernet
+        self.repo_dir = repo_dir
+        self.changes_name = changes_dir # as GitSync sees it (relative to repo_dir)
+        self.changes_dir = self._in_repo(changes_dir)
+        self.state_path = self._in_repo(state_path)
+        self.state = self._load_state()
+
+    def _in_repo(self, path):
+        return os.path.join(self.repo_dir, path) if self.repo_dir and not os.path.isabs(path) else path
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'rb') as f:
+                return vault.load_payload(self.fernet, f.read())
+        return {"device": uuid.uuid4().hex[:12], "seq": 0, "applied": [], "clock": {}}
+
+    def reload(self):
+        self.state = self._load_state()
+        if not os.path.exists(self.state_path):
+            self._save_state() # the new device id is fixed from here on
+
+    def _save_state(self):
+        vault.atomic_write(self.state_path, vault.dump_payload(self.fernet, self.state, "binary"))
+
+    # Outgoing
+    def touch(self, names=None):
+        # Called on every vault write: remembers when the written names were edited,
+        # so "last writer" means the last edit, not the last device to sync.
+        # names=None (whole-vault save) stamps every name that differs from the clock.
+        if names is not None and not names:
+            return
+        now = time.time()
+        with _state_lock:
+            self.reload()
+            if names is None:
+                vault.flush_buffers()
+                names = self._diff(self.open_vault().load())
+            edits = self.state.setdefault("edits", {})
+            for name in names:
+                edits[name] = now
+            self._save_state()
+
+    def _diff(self, data):
+        # Names whose value (or deletion) is not what the clock last saw
+        clock = self.state["clock"]
+        changed = [name for name, value in data.items()
+                   if name not in clock or clock[name][2] != value_digest(value)]
+        changed += [name for name, known in clock.items() if known[2] is not None and name not in data]
+        return changed
+
+    def record_local_changes(self):
+        # Diffs the vault against the clock and writes one change set for whatever
+        # changed since the last sync point, stamped with the edit times from
+        # touch() (now, for edits made outside the app).
+        with _state_lock:
+            self.reload()
+            return self._record_local_changes()
+
+    def _record_local_changes(self):
+        vault.flush_buffers() # write-behind edits belong in this change set
+        data = self.open_vault().load()
+        clock = self.state["clock"]
+        edits = self.state.pop("edits", {})
+        now = time.time()
+        device = self.state["device"]
+        records = []
+        for name in self._diff(data):
+            t = edits.get(name, now)
+            if name in data:
+                records.append({"k": name, "v": data[name], "t": t})
+                clock[name] = [t, device, value_digest(data[name])]
+            else:
+                records.append({"k": name, "d": 1, "t": t})
+                clock[name] = [t, device, None]
+        if records:
+            # A change set may already be pushed and applied elsewhere: never rewrite one
+            while True:
+                self.state["seq"] += 1
+                path = os.path.join(self.changes_dir, device, f"{self.state['seq']:08d}.cs")
+                if not os.path.exists(path):
+                    break
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            changeset = {"device": device, "seq": self.state["seq"], "records": records}
+            vault.atomic_write(path, vault.dump_payload(self.fernet, changeset, "binary", "zlib"))
+            self.state["applied"].append(self._relative(path))
+        self._save_state()
+        return len(records)
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.changes_dir).replace(os.sep, "/")
+
+    # Incoming
+    def pending_changesets(self):
+        applied = set(self.state["applied"])
+        found = []
+        if not os.path.isdir(self.changes_dir):
+            return found
+        for device in sorted(os.listdir(self.changes_dir)):
+            folder = os.path.join(self.changes_dir, device)
+            if device == self.state["device"] or not os.path.isdir(folder):
+                continue
+            for entry in sorted(os.listdir(folder)):
+                if entry.endswith(".cs") and f"{device}/{entry}" not in applied:
+                    found.append(os.path.join(folder, entry))
+        return found
+
+    def merge(self):
+        # Replays new change sets; returns the number of records that won locally
+        with _state_lock:
+            self.reload()
+            return self._merge()
+
+    def _merge(self):
+        paths = self.pending_changesets()
+        if not paths:
+            return 0
+        incoming = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                changeset = vault.load_payload(self.fernet, f.read())
+            for record in changeset["records"]:
+                incoming.append((record["t"], changeset["device"], record))
+        incoming.sort(key=lambda item: (item[0], item[1]))
+
+        store = self.open_vault()
+        data = store.load()
+        clock = self.state["clock"]
+        changes = {}
+        for t, device, record in incoming:
+            name = record["k"]
+            known = clock.get(name)
+            if known is not None and (known[0], known[1]) >= (t, device):
+                continue # local (or an already merged) version is newer
+            if record.get("d"):
+                data.pop(name, None)
+                clock[name] = [t, device, None]
+                changes[name] = False
+            else:
+                data[name] = record["v"]
+                clock[name] = [t, device, value_digest(record["v"])]
+                changes[name] = True
+        if changes:
+            # Only the merged names are written (log/split/sharded vaults append or
+            # rewrite just those records)
+            store.apply(data,
+                        updates=[name for name, written in changes.items() if written],
+                        deletes=[name for name, written in changes.items() if not written])
+        store.close()
+        self.state["applied"].extend(self._relative(path) for path in paths)
+        self._save_state()
+        return len(changes)
+
+    # Same interface as GitSync, so SyncRunner and AutoSync can drive either one
+    def push(self, progress=None, cwd=None, paths=None, watch=None):
+        if progress:
+            progress("Collecting changes...")
+        self.record_local_changes()
+        return GitSync.push(progress, cwd=self.repo_dir, paths=[self.changes_name])
+
+    def pull(self, progress=None, cwd=None, paths=None, watch=None):
+        # Local edits are stamped first so they can win against older remote ones
+        self.record_local_changes()
+        # No paths: the push fingerprint must not absorb change sets not yet pushed
+        result = GitSync.pull(progress, cwd=self.repo_dir)
+        if not result.ok:
+            return result
+        if progress:
+            progress("Merging changes...")
+        try:
+            self.merge()
+        except Exception as e:
+            return SyncResult("pull", False, -1, str(e), "merge")
+        return result
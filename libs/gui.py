@@ -1,9 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import clipboard
-import os
-import json
 from . import core
+from . import pure_otp
+from . import search
 
 class PasswordManagerGUI:
     def __init__(self):
@@ -13,12 +13,17 @@ class PasswordManagerGUI:
         
         self.cm = core.ConfigManager()
         self.is_setup = self.cm.load()
+        self.code_board = None
+        self.vault_session = None
+        self.sync_runner = core.SyncRunner(syncer=self.cm.syncer())
+        self.auto_sync = core.AutoSync.from_config(self.cm)
         
         if not self.is_setup:
             messagebox.showinfo("Setup Required", "Please run the CLI mode first to perform initial setup.")
             self.root.destroy()
             return
 
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.show_login()
 
     def show_login(self):
@@ -40,17 +45,15 @@ class PasswordManagerGUI:
 
     def verify_login(self):
         code = self.otp_entry.get().strip()
-        secret = self.cm.config.get("otp_secret")
         
-        # Check logic from main.py, but using core libs
-        try:
-            import pyotp
-        except ImportError:
-            from . import pure_otp as pyotp
-
-        # The simple verify check
-        totp = pyotp.TOTP(secret)
-        if totp.verify(code, valid_window=1):
+        # Check logic from main.py, but using core libs (verifier is cached by ConfigManager)
+        verifier = self.cm.otp_verifier()
+        if verifier and verifier.verify(code) is not None:
+             try:
+                 self.vault_session = self.cm.open_session(on_change=self.changed)
+             except Exception:
+                 messagebox.showerror("Error", "Could not decrypt credentials. Check your 'key.key' file.")
+                 return
              self.show_main_interface()
         else:
              messagebox.showerror("Access Denied", "Invalid OTP Code.")
@@ -65,7 +68,9 @@ class PasswordManagerGUI:
         
         ttk.Button(toolbar, text="Add Credential", command=self.add_credential_dialog).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="Refresh", command=self.refresh_list).pack(side=tk.LEFT, padx=5)
-        ttk.Button(toolbar, text="Sync (Push)", command=core.GitSync.push_data).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(toolbar, text="Authenticator", command=self.show_authenticator).pack(side=tk.LEFT, padx=5)
+        self.sync_button = ttk.Button(toolbar, text="Sync (Push)", command=self.start_sync)
+        self.sync_button.pack(side=tk.RIGHT, padx=5)
 
         # Treeview
         columns = ("service", "username")
@@ -80,6 +85,15 @@ class PasswordManagerGUI:
         
         self.tree.bind("<Double-1>", self.on_item_double_click)
 
+        # Pager: the list shows one page of the sorted names at a time
+        self.page = 0
+        pager = ttk.Frame(self.root, padding="5")
+        pager.pack(fill=tk.X)
+        ttk.Button(pager, text="< Prev", command=lambda: self.change_page(-1)).pack(side=tk.LEFT, padx=5)
+        self.page_var = tk.StringVar()
+        ttk.Label(pager, textvariable=self.page_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(pager, text="Next >", command=lambda: self.change_page(1)).pack(side=tk.LEFT, padx=5)
+
         # Status Bar
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
@@ -88,55 +102,64 @@ class PasswordManagerGUI:
         self.refresh_list()
 
     def get_credentials(self):
-        # Reusing logic from main.py's get_credentials but through ConfigManager handle?
-        # ConfigManager doesn't have get_credentials, it was in App.
-        # We need to reimplement or call usage.
-        
-        path = self.cm.config.get("data_path")
-        if not os.path.exists(path):
-            # Fallback
-            local_name = os.path.basename(path)
-            if os.path.exists(local_name):
-                 path = local_name
-            else:
-                 return {}
-        
-        with open(path, 'rb') as f:
-            encrypted_data = f.read()
-        
-        try:
-            decrypted_data = self.cm.fernet.decrypt(encrypted_data)
-            return json.loads(decrypted_data)
-        except Exception:
-            return {}
-
-    def save_credentials(self, data):
-        path = self.cm.config.get("data_path")
-        # Ensure path uses local simplified name if full path fails check? 
-        # For saving, we trust config or default.
-        json_data = json.dumps(data)
-        encrypted_data = self.cm.fernet.encrypt(json_data.encode())
-        with open(path, 'wb') as f:
-            f.write(encrypted_data)
+        # Decrypted once at login and kept in memory by the VaultSession until it
+        # idles out ("session_ttl"). Returns None once the session is locked.
+        if not self.vault_session or not self.vault_session.is_unlocked():
+            return None
+        return self.vault_session.data
+
+    def session_expired(self):
+        messagebox.showinfo("Session Locked", "Your session expired. Please verify again.")
+        self.show_login()
 
     def refresh_list(self):
+        creds = self.get_credentials()
+        if creds is None:
+            return self.session_expired()
+
         for item in self.tree.get_children():
             self.tree.delete(item)
-            
-        creds = self.get_credentials()
-        for key in sorted(creds.keys()):
+
+        size = self.cm.config.get("page_size", search.DEFAULT_PAGE_SIZE)
+        pages = self.vault_session.page_count(size)
+        self.page = min(max(self.page, 0), pages - 1)
+        for key in self.vault_session.page(self.page, size):
             self.tree.insert("", tk.END, values=(key,))
+        self.page_var.set(f"Page {self.page + 1} of {pages}")
         self.status_var.set(f"Loaded {len(creds)} credentials.")
 
+    def start_sync(self):
+        # Git runs on the SyncRunner's thread; the mainloop polls for its events
+        if not self.sync_runner.push(self.cm.sync_paths(), self.cm.watch_paths()):
+            return
+        self.sync_button.state(["disabled"])
+        self.root.after(200, self.poll_sync)
+
+    def poll_sync(self):
+        for kind, payload in self.sync_runner.poll():
+            if kind == "progress":
+                self.status_var.set(payload)
+            else:
+                if self.sync_button.winfo_exists(): # still on the main view
+                    self.sync_button.state(["!disabled"])
+                self.status_var.set("Sync complete." if payload.ok else "Sync failed.")
+                if not payload.ok:
+                    messagebox.showerror("Sync Failed", payload.message())
+                return
+        self.root.after(200, self.poll_sync)
+
+    def change_page(self, step):
+        self.page += step
+        self.refresh_list()
+
     def add_credential_dialog(self):
         service = simpledialog.askstring("Add Credential", "Enter Service Name:")
         if not service: return
         password = simpledialog.askstring("Add Credential", "Enter Password:", show='*')
         if not password: return
         
-        creds = self.get_credentials()
-        creds[service] = password
-        self.save_credentials(creds)
+        if not self.vault_session.put(service, password):
+            return self.session_expired()
         self.refresh_list()
         messagebox.showinfo("Success", "Credential Saved.")
 
@@ -147,6 +170,8 @@ class PasswordManagerGUI:
         # Security Challenge
         if self.run_railfence_gui():
              creds = self.get_credentials()
+             if creds is None:
+                 return self.session_expired()
              password = creds.get(service_name)
              
              # Show Password Dialog
@@ -173,6 +198,83 @@ class PasswordManagerGUI:
 
         ttk.Button(top, text="Copy to Clipboard", command=copy).pack(pady=10)
 
+    def show_authenticator(self):
+        # One CodeBoard per GUI session: codes for all accounts are generated once per tick
+        if self.code_board is None:
+            try:
+                self.auth_accounts = self.cm.open_authenticator().load()
+            except Exception:
+                messagebox.showerror("Error", "Could not read authenticator file.")
+                return
+            self.code_board = pure_otp.CodeBoard(self.auth_accounts)
+
+        top = tk.Toplevel(self.root)
+        top.title("Authenticator Codes")
+        top.geometry("350x400")
+
+        tree = ttk.Treeview(top, columns=("service", "code"), show="headings")
+        tree.heading("service", text="Service")
+        tree.heading("code", text="Code")
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        countdown = tk.StringVar()
+        ttk.Label(top, textvariable=countdown).pack()
+
+        def render(codes, seconds_left):
+            for item in tree.get_children():
+                tree.delete(item)
+            for name in sorted(codes):
+                tree.insert("", tk.END, values=(name, codes[name]))
+
+        def add():
+            name = simpledialog.askstring("Add Account", "Service Name:", parent=top)
+            if not name: return
+            secret = simpledialog.askstring("Add Account", "Setup Key (base32 secret):", show='*', parent=top)
+            if not secret: return
+            secret = secret.replace(" ", "").upper()
+            try:
+                self.code_board.add(name, secret)
+            except Exception:
+                messagebox.showerror("Error", "Invalid setup key.", parent=top)
+                return
+            self.auth_accounts[name] = secret
+            self.cm.open_authenticator().save(self.auth_accounts)
+            self.changed(())
+            self.code_board.tick()
+
+        def remove():
+            selection = tree.selection()
+            if not selection: return
+            name = tree.item(selection[0], "values")[0]
+            if messagebox.askyesno("Remove Account", f"Remove '{name}'?", parent=top):
+                self.auth_accounts.pop(name, None)
+                self.code_board.remove(name)
+                self.cm.open_authenticator().save(self.auth_accounts)
+                self.changed(())
+                render(self.code_board.codes(), self.code_board.seconds_left())
+
+        buttons = ttk.Frame(top)
+        buttons.pack(pady=5)
+        ttk.Button(buttons, text="Add Account", command=add).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Remove", command=remove).pack(side=tk.LEFT, padx=5)
+
+        # The board pushes each new batch to render(); the Tk timer only drives ticks
+        self.code_board.subscribe(render)
+        render(self.code_board.codes(), self.code_board.seconds_left())
+
+        def poll():
+            if not top.winfo_exists():
+                return
+            self.code_board.tick()
+            countdown.set(f"Codes change in {self.code_board.seconds_left()}s")
+            top.after(1000, poll)
+
+        def close():
+            self.code_board.unsubscribe(render)
+            top.destroy()
+
+        top.protocol("WM_DELETE_WINDOW", close)
+        poll()
+
     def run_railfence_gui(self):
         # A simplified Rail Fence Dialog (Depth 2)
         challenge_text = core.SentenceGenerator.generate()
@@ -215,6 +317,21 @@ class PasswordManagerGUI:
     def run(self):
         self.root.mainloop()
 
+    def changed(self, names=None):
+        self.cm.record_edit(names)
+        if self.auto_sync:
+            self.auto_sync.notify()
+
+    def on_close(self):
+        # Write-behind data and pending auto-sync changes go out before the window closes
+        if self.vault_session:
+            self.vault_session.lock()
+        if self.auto_sync:
+            result = self.auto_sync.close()
+            if result is not None and not result.ok:
+                messagebox.showerror("Auto-Sync Failed", result.message())
+        self.root.destroy()
+
 if __name__ == "__main__":
     app = PasswordManagerGUI()
     app.run()
@@ -4,13 +4,20 @@ import time
 import os
 import struct
 import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from . import aes
 
 class InvalidToken(Exception):
     pass
 
 class Fernet:
-    def __init__(self, key):
+    # Batches smaller than this are handled in-process by encrypt_many/decrypt_many
+    parallel_threshold = 64
+    # AES block engine (see aes.ENGINES); None uses aes.DEFAULT_ENGINE
+    engine = None
+
+    def __init__(self, key, engine=None):
         if isinstance(key, str):
             key = key.encode()
         
@@ -23,10 +30,19 @@ class Fernet:
         if len(key) != 32:
              raise ValueError("Fernet key must be 32 bytes.")
 
+        self._key = base64.urlsafe_b64encode(key)
         self._signing_key = key[:16]
         self._encryption_key = key[16:]
+        # Expand the AES key schedule once and reuse it for every token
+        if engine is not None:
+            self.engine = engine
+        self._cipher = aes.CBC(self._encryption_key, self.engine)
 
     def encrypt(self, data):
+        return base64.urlsafe_b64encode(self.encrypt_raw(data))
+
+    def encrypt_raw(self, data):
+        # Same token layout as encrypt(), without the base64 wrapping (bytes-like result)
         if not isinstance(data, bytes):
             raise TypeError("data must be bytes.")
 
@@ -35,22 +51,20 @@ class Fernet:
         
         # Format: Version (0x80) | Timestamp (8 bytes) | IV (16 bytes) | Ciphertext | HMAC (32 bytes)
         
-        # 1. Encrypt Data (AES-128-CBC)
-        ciphertext = aes.encrypt_cbc(data, self._encryption_key, iv)
-        
-        # 2. Construct Basic Token
-        basic_parts = (
-            b"\x80" +
-            struct.pack(">Q", current_time) +
-            iv +
-            ciphertext
-        )
-        
+        # 1. Construct Basic Token header
+        token = bytearray(b"\x80")
+        token += struct.pack(">Q", current_time)
+        token += iv
+
+        # 2. Encrypt Data (AES-128-CBC) straight into the token buffer
+        encryptor = self._cipher.encryptor(iv)
+        token += encryptor.update(data)
+        token += encryptor.finalize()
+
         # 3. Calculate HMAC
-        h = hmac.new(self._signing_key, basic_parts, hashlib.sha256).digest()
-        
-        # 4. Final Token
-        return base64.urlsafe_b64encode(basic_parts + h)
+        token += hmac.new(self._signing_key, token, hashlib.sha256).digest()
+
+        return token
 
     def decrypt(self, token, ttl=None):
         if not isinstance(token, bytes):
@@ -61,13 +75,19 @@ class Fernet:
         except Exception:
              raise InvalidToken
 
-        if len(data) < 57: # min length check
+        return self.decrypt_raw(data, ttl)
+
+    def decrypt_raw(self, data, ttl=None):
+        # Accepts any bytes-like token (bytes, bytearray, mmap, memoryview);
+        # fields are sliced through a memoryview without copying.
+        view = memoryview(data).cast("B")
+        if len(view) < 57: # min length check
              raise InvalidToken
              
         # Verify HMAC
         # Version(1) + TS(8) + IV(16) + Cipher(...) = Length - 32
-        h_expected = data[-32:]
-        payload = data[:-32]
+        h_expected = view[-32:]
+        payload = view[:-32]
         
         h_calc = hmac.new(self._signing_key, payload, hashlib.sha256).digest()
         
@@ -92,10 +112,72 @@ class Fernet:
         ciphertext = payload[25:]
         
         try:
-             return aes.decrypt_cbc(ciphertext, self._encryption_key, iv)
+             decryptor = self._cipher.decryptor(iv)
+             return decryptor.update(ciphertext) + decryptor.finalize()
         except Exception:
              raise InvalidToken
 
+    def encrypt_many(self, items, workers=None):
+        # Results come back in input order
+        items = list(items)
+        workers = self._pool_size(len(items), workers)
+        if workers <= 1:
+            return [self.encrypt(data) for data in items]
+        return self._run_pool(_encrypt_chunk, items, workers)
+
+    def decrypt_many(self, tokens, ttl=None, workers=None):
+        # Results come back in input order. A token that fails to verify does not
+        # abort the batch: its slot holds the InvalidToken instance instead.
+        tokens = list(tokens)
+        workers = self._pool_size(len(tokens), workers)
+        if workers <= 1:
+            return _decrypt_items(self, tokens, ttl)
+        return self._run_pool(_decrypt_chunk, tokens, workers, ttl)
+
+    def _pool_size(self, count, workers):
+        # The pure-python AES is CPU-bound, so only worker processes help (not threads).
+        # Small batches are cheaper inline than the pool start-up, unless the caller
+        # asked for workers (a few large tokens, e.g. vault shards).
+        if workers is None and count < self.parallel_threshold:
+            return 1
+        return min(workers or os.cpu_count() or 1, count)
+
+    def _run_pool(self, func, items, workers, *args):
+        # Several chunks per worker keeps the pool balanced without pickling each item separately
+        size = max(1, -(-len(items) // (workers * 4)))
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self._key, self.engine)) as pool:
+                results = pool.map(func, chunks, *([arg] * len(chunks) for arg in args))
+                return [item for chunk in results for item in chunk]
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # No multiprocessing support (e.g. some Termux/Android builds) or a worker died: stay serial
+            if func is _encrypt_chunk:
+                return [self.encrypt(data) for data in items]
+            return _decrypt_items(self, items, *args)
+
     @staticmethod
     def generate_key():
         return base64.urlsafe_b64encode(os.urandom(32))
+
+# Process pool workers: each worker process builds its own Fernet (and key schedule) once
+_worker_fernet = None
+
+def _init_worker(key, engine):
+    global _worker_fernet
+    _worker_fernet = Fernet(key, engine)
+
+def _encrypt_chunk(chunk):
+    return [_worker_fernet.encrypt(data) for data in chunk]
+
+def _decrypt_chunk(chunk, ttl=None):
+    return _decrypt_items(_worker_fernet, chunk, ttl)
+
+def _decrypt_items(fernet, tokens, ttl):
+    results = []
+    for token in tokens:
+        try:
+            results.append(fernet.decrypt(token, ttl))
+        except InvalidToken as e:
+            results.append(e)
+    return results
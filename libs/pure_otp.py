@@ -3,6 +3,7 @@ import hashlib
 import time
 import struct
 import base64
+import threading
 
 class TOTP:
     def __init__(self, s, digits=6, digest=hashlib.sha1, interval=30):
@@ -14,16 +15,21 @@ class TOTP:
         if missing_padding != 0:
             s += '=' * (8 - missing_padding)
         self.secret = base64.b32decode(s, casefold=True)
+        # Keyed HMAC state prepared once; every step only copies it
+        self._mac = hmac.new(self.secret, digestmod=self.digest)
 
     def generate_otp(self, input_val):
         if input_val < 0:
             raise ValueError("input_val must be positive integer")
         
         # Pack input value into 8 bytes big endian
-        val_struct = struct.pack('>Q', input_val)
-        
+        return self._code_for(struct.pack('>Q', input_val))
+
+    def _code_for(self, val_struct):
         # HMAC-SHA1
-        h = hmac.new(self.secret, val_struct, self.digest).digest()
+        mac = self._mac.copy()
+        mac.update(val_struct)
+        h = mac.digest()
         
         # Dynamic Truncation
         offset = h[-1] & 0x0F
@@ -38,9 +44,11 @@ class TOTP:
     def timecode(self, for_time):
         return int(for_time) // self.interval
 
-    def verify(self, otp, for_time=None, valid_window=0):
+    def verify(self, otp, for_time=None, valid_window=0, drift=0):
         if for_time is None:
             for_time = time.time()
+        # drift: calibrated device clock offset in steps (see calibrate_drift)
+        for_time += drift * self.interval
             
         if valid_window:
             tm = self.timecode(for_time)
@@ -54,6 +62,164 @@ class TOTP:
     def provisioning_uri(self, name, issuer_name=None):
         return f"otpauth://totp/{issuer_name}:{name}?secret={base64.b32encode(self.secret).decode().strip('=')}&issuer={issuer_name}"
 
+class TOTPVerifier:
+    # Long-lived verifier for one secret. The codes for the current window are
+    # cached by timecode and only the new steps are computed when the timestep
+    # advances, so each verify() is a dict lookup instead of 2*window+1 HMACs.
+    def __init__(self, s, valid_window=1, digits=6, digest=hashlib.sha1, interval=30, drift=0):
+        self.secret_b32 = s
+        self.totp = TOTP(s, digits=digits, digest=digest, interval=interval)
+        self.valid_window = valid_window
+        self.drift = drift # calibrated device offset in steps; the window is centred on it
+        self._timecode = None
+        self._codes = {}   # timecode -> code
+        self._offsets = {} # code -> offset in steps from the current timecode
+
+    def _advance(self, tm):
+        if tm == self._timecode:
+            return
+        codes = {}
+        offsets = {}
+        # Nearest steps first, so a code repeated inside the window reports the smallest drift
+        for offset in sorted(range(-self.valid_window, self.valid_window + 1), key=abs):
+            step = tm + offset
+            if step < 0:
+                continue
+            code = self._codes.get(step) or self.totp.generate_otp(step)
+            codes[step] = code
+            offsets.setdefault(code, offset)
+        self._codes = codes
+        self._offsets = offsets
+        self._timecode = tm
+
+    def verify(self, otp, for_time=None):
+        # Returns the matched drift offset in steps (0 = clocks agree) or None.
+        # Note 0 is a match: compare the result with None.
+        if for_time is None:
+            for_time = time.time()
+        self._advance(self.totp.timecode(for_time) + self.drift)
+        offset = self._offsets.get(str(otp).strip())
+        return None if offset is None else offset + self.drift
+
+# Default calibration range: +/- 24 hours of device clock error
+CALIBRATION_SPAN = 24 * 3600
+
+def calibrate_drift(s, codes, for_time=None, span=CALIBRATION_SPAN, digits=6, digest=hashlib.sha1, interval=30):
+    # Finds a device's clock offset (in steps) from one or more consecutive codes
+    # shown by the authenticator app. All codes in +/- span are generated once into a
+    # code -> offsets index; with a 1-in-a-million code space a wide span has a
+    # few accidental matches, which the following consecutive codes rule out.
+    # Returns the offset or None when the codes do not line up anywhere.
+    totp = TOTP(s, digits=digits, digest=digest, interval=interval)
+    if for_time is None:
+        for_time = time.time()
+    tm = totp.timecode(for_time)
+    steps = span // interval
+
+    index = {}
+    for offset in range(-steps, steps + 1):
+        if tm + offset >= 0:
+            index.setdefault(totp.generate_otp(tm + offset), []).append(offset)
+
+    codes = [str(c).strip() for c in codes]
+    candidates = index.get(codes[0], [])
+    for i, code in enumerate(codes[1:], 1):
+        later = set(index.get(code, ()))
+        candidates = [o for o in candidates if o + i in later]
+    if not candidates:
+        return None
+    return min(candidates, key=abs)
+
+class CodeBoard:
+    # Authenticator for many accounts (service name -> base32 secret). Every code is
+    # generated once per timestep in one batch and pushed to subscribers, so the
+    # CLI/GUI/webapp views just render the latest batch instead of recomputing it
+    # on every redraw. Drive it with tick() from a UI timer, or start() a thread.
+    def __init__(self, accounts=None, interval=30):
+        self.interval = interval
+        self._accounts = {}
+        self._codes = {}
+        self._timecode = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        for name, secret in (accounts or {}).items():
+            self.add(name, secret)
+
+    def add(self, name, secret):
+        # Raises (binascii.Error) for an invalid base32 secret
+        totp = TOTP(secret.replace(" ", "").upper(), interval=self.interval)
+        with self._lock:
+            self._accounts[name] = totp
+            self._timecode = None # regenerate on next access
+
+    def remove(self, name):
+        with self._lock:
+            self._accounts.pop(name, None)
+            self._codes.pop(name, None)
+
+    def names(self):
+        return sorted(self._accounts)
+
+    def subscribe(self, callback):
+        # callback(codes, seconds_left) is called once per new batch
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def seconds_left(self, for_time=None):
+        if for_time is None:
+            for_time = time.time()
+        return self.interval - int(for_time) % self.interval
+
+    def codes(self, for_time=None):
+        # Latest batch (name -> code); regenerated only when the timestep changes
+        if for_time is None:
+            for_time = time.time()
+        self._refresh(int(for_time) // self.interval)
+        return dict(self._codes)
+
+    def tick(self, for_time=None):
+        # Regenerate if the timestep advanced and notify subscribers. Returns True on a new batch.
+        if for_time is None:
+            for_time = time.time()
+        if not self._refresh(int(for_time) // self.interval):
+            return False
+        codes = dict(self._codes)
+        left = self.seconds_left(for_time)
+        for callback in list(self._listeners):
+            callback(codes, left)
+        return True
+
+    def _refresh(self, tm):
+        with self._lock:
+            if tm == self._timecode:
+                return False
+            # The counter block is shared by every account with this interval
+            val_struct = struct.pack('>Q', tm)
+            self._codes = {name: totp._code_for(val_struct) for name, totp in self._accounts.items()}
+            self._timecode = tm
+            return True
+
+    def start(self):
+        # Background scheduler: one batch per tick, right after the step boundary
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(self.seconds_left())
+
 def random_base32(length=32):
     return base64.b32encode(os.urandom(20)).decode('utf-8')[:length]
 
@@ -0,0 +1,163 @@
+import bisect
+from collections import defaultdict
+
+# Fuzzy matches below this trigram similarity (Dice coefficient, 0..1) are dropped
+FUZZY_THRESHOLD = 0.3
+
+# Names per page for the CLI pickers, the GUI list and the webapp (pm_config.json: "page_size")
+DEFAULT_PAGE_SIZE = 20
+
+def normalize(name):
+    return " ".join(name.lower().split())
+
+def trigrams(text, padded=False):
+    # Padded trigrams give word starts/ends their own grams (better fuzzy scores);
+    # plain ones are what a substring query must contain.
+    if padded:
+        text = "  " + text + " "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    # In-memory search index over service names, built once per unlock and kept up
+    # to date by add()/remove(). A substring query only verifies the names that
+    # contain all of its trigrams (intersection of the posting sets, smallest
+    # first); a fuzzy query scores names by how many trigrams they share with it.
+    def __init__(self, names=()):
+        self._norm = {}                 # name -> normalized name
+        self._grams = defaultdict(set)  # padded trigram -> names
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._norm)
+
+    def __contains__(self, name):
+        return name in self._norm
+
+    def add(self, name):
+        if name in self._norm:
+            return
+        norm = normalize(name)
+        self._norm[name] = norm
+        for gram in trigrams(norm, padded=True):
+            self._grams[gram].add(name)
+
+    def remove(self, name):
+        norm = self._norm.pop(name, None)
+        if norm is None:
+            return
+        for gram in trigrams(norm, padded=True):
+            names = self._grams.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._grams[gram]
+
+    def clear(self):
+        self._norm.clear()
+        self._grams.clear()
+
+    def substring(self, query):
+        # Every name containing the query (case-insensitive)
+        query = normalize(query)
+        if not query:
+            return list(self._norm)
+        grams = trigrams(query)
+        if not grams:
+            # Shorter than a trigram: the normalized names are cached, no re-lowering
+            return [name for name, norm in self._norm.items() if query in norm]
+        postings = sorted((self._grams.get(gram, ()) for gram in grams), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for names in postings[1:]:
+            candidates &= names
+            if not candidates:
+                return []
+        return [name for name in candidates if query in self._norm[name]]
+
+    def fuzzy(self, query, threshold=FUZZY_THRESHOLD):
+        # (score, name) for names sharing enough trigrams with the query (typos,
+        # swapped letters); only names sharing at least one trigram are looked at.
+        grams = trigrams(normalize(query), padded=True)
+        if not grams:
+            return []
+        shared = defaultdict(int)
+        for gram in grams:
+            for name in self._grams.get(gram, ()):
+                shared[name] += 1
+        results = []
+        for name, count in shared.items():
+            total = len(grams) + len(trigrams(self._norm[name], padded=True))
+            score = 2.0 * count / total
+            if score >= threshold:
+                results.append((score, name))
+        return results
+
+    def search(self, query, limit=None, fuzzy=True):
+        # Ranked names: exact match, then prefix, then other substring matches
+        # (earlier and shorter first), then fuzzy matches by similarity.
+        query_norm = normalize(query)
+        if not query_norm:
+            return sorted(self._norm, key=str.lower)[:limit]
+        ranked = []
+        for name in self.substring(query_norm):
+            norm = self._norm[name]
+            ranked.append(((0 if norm == query_norm else 1, norm.find(query_norm), len(norm), norm), name))
+        ranked.sort()
+        results = [name for _, name in ranked]
+        if fuzzy and (limit is None or len(results) < limit):
+            seen = set(results)
+            extra = [(-score, self._norm[name], name) for score, name in self.fuzzy(query_norm) if name not in seen]
+            extra.sort()
+            results.extend(name for _, _, name in extra)
+        return results[:limit] if limit is not None else results
+
+def sort_key(name):
+    return (name.lower(), name)
+
+class SortedNames:
+    # Names kept in display order (case-insensitive) in a sorted array. Writes are
+    # one bisect + list insert/delete instead of re-sorting every key, and pages
+    # are slices, so listing a large vault only touches one page of names.
+    def __init__(self, names=()):
+        self._keys = sorted(sort_key(name) for name in names)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return (name for _, name in self._keys)
+
+    def __contains__(self, name):
+        key = sort_key(name)
+        i = bisect.bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def add(self, name):
+        key = sort_key(name)
+        i = bisect.bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            self._keys.insert(i, key)
+
+    def remove(self, name):
+        key = sort_key(name)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def page_count(self, size=DEFAULT_PAGE_SIZE):
+        return max(1, -(-len(self._keys) // size))
+
+    def page(self, number, size=DEFAULT_PAGE_SIZE):
+        # Zero-based page number, clamped to the last page
+        number = min(max(number, 0), self.page_count(size) - 1)
+        start = number * size
+        return [name for _, name in self._keys[start:start + size]]
+
+    def after(self, cursor=None, size=DEFAULT_PAGE_SIZE):
+        # Cursor paging: the `size` names following `cursor` (the last name of the
+        # previous page, None for the first page). Stays correct while names are
+        # added or removed between calls.
+        start = 0 if cursor is None else bisect.bisect_right(self._keys, sort_key(cursor))
+        return [name for _, name in self._keys[start:start + size]]
@@ -0,0 +1,103 @@
+import json
+
+# Compact binary encoding for the vault's {name: value} mapping, used instead of
+# JSON when pm_config.json has "serialization": "binary".
+#
+#   MAGIC | version | flags | [string table] | entry count | entries
+#
+# Integers are LEB128 varints and strings are [varint byte length][UTF-8], so
+# loads() walks the decrypted buffer once without building a JSON text first.
+# With FLAG_TABLE the distinct values are stored once in a table and every
+# entry refers to its value by index (reused passwords, shared TOTP secrets).
+# Values that are not strings cannot be encoded; dumps() falls back to JSON.
+MAGIC = b"CMB"
+VERSION = 1
+FLAG_TABLE = 0x01
+
+def is_binary(buf):
+    return buf[:len(MAGIC)] == MAGIC
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _put_str(out, text):
+    raw = text.encode()
+    _put_varint(out, len(raw))
+    out += raw
+
+def _get_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _get_str(buf, pos):
+    length, pos = _get_varint(buf, pos)
+    end = pos + length
+    if end > len(buf):
+        raise ValueError("Truncated binary vault payload.")
+    return str(buf[pos:end], "utf-8"), end
+
+def dumps(data, string_table=None):
+    # string_table: True/False forces it; None uses it only when values repeat
+    if not all(isinstance(key, str) and isinstance(value, str) for key, value in data.items()):
+        return json.dumps(data).encode()
+    values = list(data.values())
+    if string_table is None:
+        string_table = len(set(values)) < len(values)
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out.append(FLAG_TABLE if string_table else 0)
+    if string_table:
+        slots = {}
+        for value in values:
+            slots.setdefault(value, len(slots))
+        _put_varint(out, len(slots))
+        for value in slots:
+            _put_str(out, value)
+    _put_varint(out, len(data))
+    for key, value in data.items():
+        _put_str(out, key)
+        if string_table:
+            _put_varint(out, slots[value])
+        else:
+            _put_str(out, value)
+    return bytes(out)
+
+def loads(buf):
+    # Accepts the binary encoding or JSON (vaults written before this format)
+    if not is_binary(buf):
+        return json.loads(bytes(buf))
+    view = memoryview(buf)
+    pos = len(MAGIC)
+    version, flags = view[pos], view[pos + 1]
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary vault version: {version}")
+    pos += 2
+    table = None
+    if flags & FLAG_TABLE:
+        count, pos = _get_varint(view, pos)
+        table = []
+        for _ in range(count):
+            value, pos = _get_str(view, pos)
+            table.append(value)
+    count, pos = _get_varint(view, pos)
+    data = {}
+    for _ in range(count):
+        key, pos = _get_str(view, pos)
+        if table is None:
+            value, pos = _get_str(view, pos)
+        else:
+            slot, pos = _get_varint(view, pos)
+            value = table[slot]
+        data[key] = value
+    return data
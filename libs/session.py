@@ -0,0 +1,166 @@
+import threading
+import time
+from . import search
+
+# Idle seconds before an unlocked vault is wiped from memory (pm_config.json: "session_ttl")
+DEFAULT_TTL = 300
+
+class VaultSession:
+    # Holds the decrypted vault after one identity check so every following action
+    # works in memory instead of re-verifying and re-decrypting the file. After
+    # `ttl` idle seconds a timer wipes the data and the session is locked again.
+    # ttl <= 0 keeps the old behaviour: the session is locked before the next action.
+    def __init__(self, vault, ttl=DEFAULT_TTL, on_change=None):
+        self.vault = vault
+        self.ttl = ttl
+        self.on_change = on_change # called with the written names (None: all) after every persisted write
+        self._data = None
+        self._index = None
+        self._sorted = None
+        self._last_used = 0.0
+        self._timer = None
+        # A write-behind vault flushes from its own timer thread: share its lock
+        self._lock = getattr(vault, "lock", None) or threading.RLock()
+
+    def unlock(self):
+        # Raises whatever the vault raises (e.g. InvalidToken for a wrong key).
+        # Indexed vaults hand out a lazy mapping: only the names are decrypted here,
+        # each password is decrypted when it is actually read.
+        data = self.vault.lazy_view()
+        if data is None:
+            data = self.vault.load()
+        with self._lock:
+            self._data = data
+            self._index = search.TrigramIndex(data) # names only
+            self._sorted = search.SortedNames(data)
+            self._touch()
+
+    def lock(self):
+        with self._lock:
+            self.vault.close() # flushes pending write-behind changes while the data still exists
+            if self._data is not None:
+                self._data.clear() # Best effort: drop every reference held by the dict
+            self._data = None
+            self._index = None
+            self._sorted = None
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def is_unlocked(self):
+        with self._lock:
+            if self._data is not None and self._idle() >= self.ttl:
+                self.lock()
+            return self._data is not None
+
+    @property
+    def data(self):
+        with self._lock:
+            if self._data is None:
+                raise RuntimeError("Vault session is locked.")
+            self._touch()
+            return self._data
+
+    def search(self, query, limit=None, fuzzy=True):
+        # Ranked service names for a substring / typo-tolerant query (see search.TrigramIndex)
+        with self._lock:
+            if self._data is None:
+                raise RuntimeError("Vault session is locked.")
+            self._touch()
+            return self._index.search(query, limit, fuzzy)
+
+    # Sorted listing, one page at a time (see search.SortedNames)
+    def page(self, number, size=None):
+        with self._lock:
+            if self._data is None:
+                raise RuntimeError("Vault session is locked.")
+            self._touch()
+            return self._sorted.page(number, size or search.DEFAULT_PAGE_SIZE)
+
+    def page_count(self, size=None):
+        with self._lock:
+            if self._data is None:
+                raise RuntimeError("Vault session is locked.")
+            return self._sorted.page_count(size or search.DEFAULT_PAGE_SIZE)
+
+    def names_after(self, cursor=None, size=None):
+        with self._lock:
+            if self._data is None:
+                raise RuntimeError("Vault session is locked.")
+            self._touch()
+            return self._sorted.after(cursor, size or search.DEFAULT_PAGE_SIZE)
+
+    # Writes update memory and persist the vault. They return False when the
+    # session expired in the meantime (nothing is written then). on_change runs
+    # after the lock is released: it may take locks of its own (delta sync state).
+    def put(self, name, value):
+        return self.put_many({name: value})
+
+    def put_many(self, items):
+        with self._lock:
+            if self._data is None:
+                return False
+            self._data.update(items)
+            for name in items:
+                self._index.add(name)
+                self._sorted.add(name)
+            self.vault.apply(self._data, updates=list(items))
+            self._touch()
+        self._changed(list(items))
+        return True
+
+    def delete(self, name):
+        with self._lock:
+            if self._data is None:
+                return False
+            deleted = name in self._data
+            if deleted:
+                del self._data[name]
+                self._index.remove(name)
+                self._sorted.remove(name)
+                self.vault.apply(self._data, deletes=[name])
+            self._touch()
+        if deleted:
+            self._changed([name])
+        return True
+
+    def replace(self, data):
+        with self._lock:
+            if self._data is None:
+                return False
+            self._data.clear()
+            self._data.update(data)
+            self._index = search.TrigramIndex(self._data)
+            self._sorted = search.SortedNames(self._data)
+            self.vault.save(self._data)
+            self._touch()
+        self._changed()
+        return True
+
+    def _changed(self, names=None):
+        if self.on_change:
+            self.on_change(names)
+
+    def _idle(self):
+        return time.monotonic() - self._last_used
+
+    def _touch(self):
+        self._last_used = time.monotonic()
+        if self.ttl > 0 and self._timer is None:
+            self._schedule(self.ttl)
+
+    def _schedule(self, delay):
+        self._timer = threading.Timer(delay, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        with self._lock:
+            self._timer = None
+            if self._data is None:
+                return
+            remaining = self.ttl - self._idle()
+            if remaining > 0:
+                self._schedule(remaining) # used since the timer was armed
+            else:
+                self.lock()
@@ -0,0 +1,981 @@
+import os
+import hmac
+import json
+import mmap
+import hashlib
+import time
+import base64
+import atexit
+import struct
+import threading
+import zlib
+import functools
+from collections.abc import MutableMapping
+from . import serialize
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# On-disk container formats for the encrypted vault file:
+#   "base64" - a standard Fernet token (url-safe base64 text). Legacy default.
+#   "binary" - the same Version | Timestamp | IV | Ciphertext | HMAC layout as raw
+#              bytes. About 25% smaller and skips two full-size base64 copies.
+#   "log"    - append-only log: every credential is its own encrypted record, deletes
+#              are tombstone records. A write appends one record instead of
+#              re-encrypting the whole vault; loading replays the log.
+#   "sharded" - names are spread over N shard files by a hash of the name; a write
+#              re-encrypts (and Git commits) only the shards it touched.
+#   "split"  - a small encrypted names/metadata segment followed by one encrypted
+#              token per secret: listing decrypts only the names, revealing a
+#              password decrypts only that password.
+# All are detected automatically on load: the log starts with LOG_MAGIC, the shard
+# manifest with SHARD_MAGIC, the split file with SPLIT_MAGIC, a raw token with the
+# 0x80 version byte, a base64 token with the text "gAAAAA".
+FORMATS = ("base64", "binary", "log", "sharded", "split")
+DEFAULT_FORMAT = "base64"
+_RAW_VERSION = 0x80
+
+# Log layout: LOG_MAGIC, then records of
+#   [4-byte big-endian token length][32-byte blind tag][raw Fernet token]
+# Token plaintext is JSON: {"k": name, "v": value, "t": time} or {"k": name, "d": 1, "t": time}
+# The blind tag is HMAC-SHA256(name) under a key derived from key.key: an exact
+# name can be found by comparing tags, without decrypting anything, while names
+# stay opaque on disk and in Git. (Version 1 logs have no tag and are still read.)
+# Next to the log, "<path>.idx" holds one small encrypted token mapping each name to
+# the byte range of its latest record, so a single credential can be read from an
+# mmap of the log without decrypting anything else.
+LOG_MAGIC = b"CMLOG\x02"
+_LOG_PREFIX = b"CMLOG"
+_LEN = struct.Struct(">I")
+_TAG_SIZE = 32
+
+# Compressed payloads (pm_config.json: "compression" = "zlib" | "lzma", optional
+# "compression_level"): the plaintext is PAYLOAD_MAGIC + version + codec id +
+# compressed body, so less data goes through AES and into Git. Uncompressed
+# bodies are still read, so both kinds can be mixed freely.
+PAYLOAD_MAGIC = b"CMZ"
+_PAYLOAD_VERSION = 1
+CODECS = {"zlib": 1, "lzma": 2}
+
+def compress_payload(data, compression=None, level=None):
+    if not compression or compression == "none":
+        return data
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression: {compression}")
+    if compression == "zlib":
+        body = zlib.compress(data, -1 if level is None else level)
+    else:
+        if lzma is None:
+            raise RuntimeError("lzma compression is not available in this Python build.")
+        body = lzma.compress(data, preset=6 if level is None else level)
+    return PAYLOAD_MAGIC + bytes((_PAYLOAD_VERSION, CODECS[compression])) + body
+
+def decompress_payload(data):
+    if data[:len(PAYLOAD_MAGIC)] != PAYLOAD_MAGIC:
+        return data # legacy plain JSON
+    version, codec = data[len(PAYLOAD_MAGIC)], data[len(PAYLOAD_MAGIC) + 1]
+    if version != _PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported payload version: {version}")
+    body = data[len(PAYLOAD_MAGIC) + 2:]
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(body)
+    if codec == CODECS["lzma"]:
+        if lzma is None:
+            raise RuntimeError("Vault is lzma-compressed but lzma is not available in this Python build.")
+        return lzma.decompress(body)
+    raise ValueError(f"Unknown payload codec: {codec}")
+
+# Plaintext body: JSON, or serialize's compact binary encoding for the vault
+# mapping (pm_config.json: "serialization" = "binary"). Both are always read.
+SERIALIZATIONS = ("json", "binary")
+
+def load_payload(fernet, token):
+    return serialize.loads(decompress_payload(decrypt_token(fernet, token)))
+
+def dump_payload(fernet, obj, fmt=DEFAULT_FORMAT, compression=None, level=None, serialization=None):
+    if serialization == "binary":
+        body = serialize.dumps(obj)
+    else:
+        body = json.dumps(obj).encode()
+    return encrypt_token(fernet, compress_payload(body, compression, level), fmt)
+
+# Shard layout: `path` holds SHARD_MAGIC + 2-byte shard count + the SHA-256 of each
+# shard file (all zero while the shard is empty and absent); shard i is the raw
+# token "<path>.shards/<i>.dat". pm_config.json: "vault_shards". A shard file that
+# is missing or not the one the manifest names is an error, not an empty shard.
+# Version 1 manifests (no digests) are still read and get digests on the next write.
+_SHARD_PREFIX = b"CMSHARD"
+SHARD_MAGIC = _SHARD_PREFIX + b"\x02"
+_SHARD_COUNT = struct.Struct(">H")
+_NO_SHARD = bytes(32)
+DEFAULT_SHARDS = 16
+# Below this many encrypted bytes the shards are decrypted in-process
+PARALLEL_BYTES = 256 * 1024
+
+@functools.lru_cache(maxsize=65536)
+def shard_of(name, count):
+    # Stable across runs and machines (unlike hash()), so every clone agrees
+    digest = hashlib.sha256(name.encode()).digest()
+    return int.from_bytes(digest[:4], "big") % count
+
+# Split layout: SPLIT_MAGIC | 4-byte length | metadata token | secret tokens...
+# The metadata token holds {name: [offset, length, modified time, SHA-256 of the
+# token]} pointing at each raw secret token (its plaintext is the JSON-encoded
+# value); offsets count from the end of the metadata token. The digest ties a
+# token to its name, so swapped or replayed secret tokens fail to read (entries
+# written before it had no digest and gain one on the next write).
+SPLIT_MAGIC = b"CMSPLIT\x01"
+
+def detect_format(blob):
+    if not blob:
+        return None
+    if blob[:len(_LOG_PREFIX)] == _LOG_PREFIX:
+        return "log"
+    if blob[:len(_SHARD_PREFIX)] == _SHARD_PREFIX:
+        return "sharded"
+    if blob[:len(SPLIT_MAGIC)] == SPLIT_MAGIC:
+        return "split"
+    return "binary" if blob[0] == _RAW_VERSION else "base64"
+
+def encrypt_token(fernet, data, fmt=DEFAULT_FORMAT):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown vault format: {fmt}")
+    if fmt == "base64":
+        return fernet.encrypt(data)
+    if hasattr(fernet, "encrypt_raw"):
+        return fernet.encrypt_raw(data)
+    # Backends without a raw API (cryptography): strip the base64 layer
+    return base64.urlsafe_b64decode(fernet.encrypt(data))
+
+def decrypt_token(fernet, blob):
+    if detect_format(blob) == "base64":
+        return fernet.decrypt(bytes(blob))
+    if hasattr(fernet, "decrypt_raw"):
+        return fernet.decrypt_raw(blob)
+    return fernet.decrypt(base64.urlsafe_b64encode(blob))
+
+def atomic_write(path, data):
+    # Write next to the target and swap it in, so a crash never leaves half a vault
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def open_vault(path, fernet, fmt=None, blind_key=None, compression=None, level=None, serialization=None, shards=None, write=True):
+    # Picks the writer for the configured format; every class reads all formats.
+    # write=False is for read-only callers: they never replay a crash journal, which
+    # a live write-behind vault (maybe in another process) may still own.
+    buffered = _buffered.get(path)
+    if buffered is not None:
+        buffered.flush() # pending write-behind changes first, so this reader sees them
+    if fmt == "log":
+        store = LogVault(path, fernet, fmt, blind_key, compression, level, serialization, shards)
+    elif fmt == "sharded":
+        store = ShardedVault(path, fernet, fmt, blind_key, compression, level, serialization, shards)
+    elif fmt == "split":
+        store = SplitVault(path, fernet, fmt, blind_key, compression, level, serialization, shards)
+    else:
+        store = Vault(path, fernet, fmt, blind_key, compression, level, serialization, shards)
+    if write and _buffered.get(path) is None:
+        recover_journal(store)
+    return store
+
+def derive_blind_key(key):
+    # Separate sub-key for name tags, derived from the Fernet key in key.key
+    if isinstance(key, str):
+        key = key.encode()
+    raw = base64.urlsafe_b64decode(key)
+    return hmac.new(raw, b"cred-manager blind index v1", hashlib.sha256).digest()
+
+def blind_tag(blind_key, name):
+    return hmac.new(blind_key, name.encode(), hashlib.sha256).digest()
+
+def record_header_size(blob):
+    # Version 1 logs have no blind tag in front of each token
+    return _LEN.size + (_TAG_SIZE if blob[len(_LOG_PREFIX)] >= 2 else 0)
+
+def encode_record(fernet, name, value=None, deleted=False, blind_key=None):
+    record = {"k": name, "t": time.time()}
+    if deleted:
+        record["d"] = 1
+    else:
+        record["v"] = value
+    token = encrypt_token(fernet, json.dumps(record).encode(), "binary")
+    tag = blind_tag(blind_key, name) if blind_key else bytes(_TAG_SIZE)
+    return _LEN.pack(len(token)) + tag + token
+
+def iter_log(blob):
+    # Yields (offset, token_start, end) for every complete record; the blind tag (if
+    # any) sits right before token_start. A torn record at the end (crash during
+    # append) stops the scan, so the last `end` is the end of the valid log.
+    header = record_header_size(blob)
+    size = len(blob)
+    pos = len(LOG_MAGIC)
+    while pos + header <= size:
+        (length,) = _LEN.unpack_from(blob, pos)
+        start = pos + header
+        if start + length > size:
+            break
+        yield pos, start, start + length
+        pos = start + length
+
+def replay_log(fernet, blob):
+    # Returns (data, index, record_count, valid_end); index maps name -> [offset, length]
+    data = {}
+    index = {}
+    count = 0
+    end = len(LOG_MAGIC)
+    view = memoryview(blob)
+    for offset, start, end in iter_log(blob):
+        record = load_payload(fernet, view[start:end])
+        if record.get("d"):
+            data.pop(record["k"], None)
+            index.pop(record["k"], None)
+        else:
+            data[record["k"]] = record["v"]
+            index[record["k"]] = [offset, end - offset]
+        count += 1
+    return data, index, count, end
+
+class LazyCredentials(MutableMapping):
+    # Dict-like view of an indexed vault: names come from the index, and each
+    # password is decrypted from its own record the first time it is read.
+    # Listing and searching names never decrypts a secret.
+    def __init__(self, vault):
+        self.vault = vault
+        self._names = dict.fromkeys(vault.names())
+        self._values = {}
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        if name not in self._values:
+            self._values[name] = self.vault.get(name)
+        return self._values[name]
+
+    def __setitem__(self, name, value):
+        self._names[name] = None
+        self._values[name] = value
+
+    def __delitem__(self, name):
+        del self._names[name]
+        self._values.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def __len__(self):
+        return len(self._names)
+
+    def clear(self):
+        self._names.clear()
+        self._values.clear()
+
+class Vault:
+    def __init__(self, path, fernet, fmt=None, blind_key=None, compression=None, level=None, serialization=None, shards=None):
+        self.path = path
+        self.fernet = fernet
+        self.format = fmt or DEFAULT_FORMAT
+        self.blind_key = blind_key # only used by the log format
+        # Whole-vault tokens and the log's name index are compressed; single log
+        # records are too small to gain anything.
+        self.compression = compression
+        self.level = level
+        self.serialization = serialization
+        self.shards = shards or DEFAULT_SHARDS # only used by the sharded format
+
+    def read_blob(self):
+        if not os.path.exists(self.path):
+            return b""
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def load(self):
+        blob = self.read_blob()
+        if not blob:
+            return {}
+        if detect_format(blob) == "log":
+            return replay_log(self.fernet, blob)[0]
+        if detect_format(blob) == "sharded":
+            return ShardedVault(self.path, self.fernet).load()
+        if detect_format(blob) == "split":
+            return SplitVault(self.path, self.fernet).load()
+        return load_payload(self.fernet, blob)
+
+    def save(self, data):
+        atomic_write(self.path, dump_payload(self.fernet, data, self.format, self.compression, self.level, self.serialization))
+
+    def apply(self, data, updates=(), deletes=()):
+        # Persist a change. `data` is the full vault after the change; `updates` are
+        # the names written and `deletes` the names removed. A single-token vault
+        # can only be rewritten as a whole.
+        self.save(data)
+
+    def compact(self):
+        pass
+
+    # Single-entry access; a single-token vault has to decrypt everything for these
+    def names(self):
+        return list(self.load())
+
+    def get(self, name):
+        return self.load().get(name)
+
+    def lookup(self, name):
+        # Exact-name query (the log format answers it through the blind index)
+        return self.get(name)
+
+    def lazy_view(self):
+        # Mapping for a VaultSession; None means load() everything up front
+        return None
+
+    def close(self):
+        pass
+
+    def stored_format(self):
+        return detect_format(self.read_blob())
+
+    def convert(self, fmt):
+        # Re-encode the vault file in place (e.g. legacy base64 -> binary or log)
+        blob = self.read_blob()
+        self.format = fmt
+        if blob and detect_format(blob) != fmt:
+            data = self.load()
+            open_vault(self.path, self.fernet, fmt, self.blind_key, self.compression,
+                       self.level, self.serialization, self.shards).save(data)
+            if detect_format(blob) == "sharded":
+                ShardedVault(self.path, self.fernet).remove_shards(0)
+
+class LogVault(Vault):
+    # Rewrite the log once dead records (overwritten values, tombstones) outnumber live ones
+    compact_slack = 32
+
+    def __init__(self, path, fernet, fmt="log", blind_key=None, compression=None, level=None, serialization=None, shards=None):
+        super().__init__(path, fernet, "log", blind_key, compression, level, serialization, shards)
+        self.index_path = path + ".idx"
+        self._tagged = False
+        self._tags = None
+        self._records = 0
+        self._valid_end = None
+        self._tail = b"" # last bytes before _valid_end, to notice a log changed elsewhere
+        self._index = None
+        self._map = None
+        self._map_file = None
+        # Reads through the mmap and the writes that close it may run on different
+        # threads (a BufferedVault flush timer): both hold this lock
+        self.lock = threading.RLock()
+
+    def load(self):
+        blob = self.read_blob()
+        if detect_format(blob) != "log":
+            # Legacy single-token vault: the first write converts it to a log
+            self._valid_end = None
+            self._index = None
+            return super().load()
+        data, self._index, self._records, self._valid_end = replay_log(self.fernet, blob)
+        self._tail = bytes(blob[max(0, self._valid_end - _TAG_SIZE):self._valid_end])
+        self._tagged = record_header_size(blob) > _LEN.size
+        self._write_index(blob)
+        return data
+
+    def save(self, data):
+        # Full rewrite: one record per live credential
+        items = list(data.items()) # may read lazily from the current log: do it before replacing it
+        out = bytearray(LOG_MAGIC)
+        index = {}
+        for name, value in items:
+            record = encode_record(self.fernet, name, value, blind_key=self.blind_key)
+            index[name] = [len(out), len(record)]
+            out += record
+        self._close_map()
+        atomic_write(self.path, out)
+        self._tagged = True
+        self._tags = None
+        self._records = len(items)
+        self._valid_end = len(out)
+        self._tail = bytes(out[-_TAG_SIZE:])
+        self._index = index
+        self._write_index(out)
+
+    def apply(self, data, updates=(), deletes=()):
+        if self._valid_end is None or not self._tagged or not os.path.exists(self.path):
+            return self.save(data) # new file, legacy blob or version 1 log: rewrite as current log
+        if self._changed_on_disk():
+            # Another writer (git pull, another process) moved the log: re-read its
+            # offsets and append after its current end instead of cutting it off
+            self._close_map()
+            self._index = None
+            self._read_index()
+            if self._valid_end is None or not self._tagged:
+                return self.save(data)
+        if self._records + len(updates) + len(deletes) > 2 * len(data) + self.compact_slack:
+            return self.save(data)
+
+        out = bytearray()
+        for name in updates:
+            record = encode_record(self.fernet, name, data[name], blind_key=self.blind_key)
+            self._index[name] = [self._valid_end + len(out), len(record)]
+            out += record
+        for name in deletes:
+            out += encode_record(self.fernet, name, deleted=True, blind_key=self.blind_key)
+            self._index.pop(name, None)
+        self._close_map()
+        self._tags = None
+        with open(self.path, 'r+b') as f:
+            # Drop a torn tail left by an interrupted append before writing after it
+            f.truncate(self._valid_end)
+            f.seek(self._valid_end)
+            f.write(out)
+            f.flush()
+            os.fsync(f.fileno())
+        self._records += len(updates) + len(deletes)
+        self._valid_end += len(out)
+        self._tail = (self._tail + bytes(out))[-_TAG_SIZE:]
+        self._write_index(out)
+
+    def _changed_on_disk(self):
+        # True unless the file still ends at _valid_end with the same last bytes,
+        # or only a torn (incomplete) record follows it
+        header = _LEN.size + _TAG_SIZE
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size < self._valid_end:
+                return True
+            f.seek(self._valid_end - len(self._tail))
+            if f.read(len(self._tail)) != self._tail:
+                return True
+            head = f.read(header)
+        if len(head) < header:
+            return False
+        (length,) = _LEN.unpack_from(head)
+        return self._valid_end + header + length <= size
+
+    def compact(self):
+        self.save(self.load())
+
+    # Offset index
+    def _write_index(self, tail_source):
+        # The index records the log end and its last 32 bytes (the HMAC of the last
+        # record), so a log changed elsewhere (e.g. by git pull) is detected as stale.
+        index = {
+            "end": self._valid_end,
+            "tail": bytes(tail_source[-32:]).hex(),
+            "records": self._records,
+            "tagged": self._tagged,
+            "names": self._index,
+        }
+        atomic_write(self.index_path, dump_payload(self.fernet, index, "binary", self.compression, self.level))
+
+    def _read_index(self):
+        if self._index is not None:
+            return self._index
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = load_payload(self.fernet, f.read())
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, index["end"] - 32))
+                tail = f.read(32).hex()
+            if size == index["end"] and tail == index["tail"]:
+                self._index = index["names"]
+                self._records = index["records"]
+                self._valid_end = index["end"]
+                self._tail = bytes.fromhex(index["tail"])
+                self._tagged = index.get("tagged", False)
+                return self._index
+        except Exception:
+            pass
+        # Missing or stale index: one full replay rebuilds it
+        self.load()
+        return self._index
+
+    def _open_map(self):
+        if self._map is None:
+            self._map_file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        self._close_map()
+
+    def _close_map(self):
+        # Must happen before the file is rewritten (Windows cannot replace a mapped file)
+        with self.lock:
+            if self._map is not None:
+                self._map.close()
+                self._map_file.close()
+                self._map = None
+                self._map_file = None
+
+    def names(self):
+        if self.stored_format() != "log":
+            return super().names()
+        return list(self._read_index() or {})
+
+    def get(self, name):
+        if self.stored_format() != "log":
+            return super().get(name)
+        with self.lock:
+            entry = (self._read_index() or {}).get(name)
+            if entry is None:
+                return None
+            offset, length = entry
+            return self._read_record(offset, offset + length)["v"]
+
+    def _read_record(self, offset, end):
+        # Decrypt only this record's bytes, straight out of the mapped file
+        with self.lock:
+            mapped = self._open_map()
+            token = memoryview(mapped)[offset + record_header_size(mapped):end]
+            try:
+                return load_payload(self.fernet, token)
+            finally:
+                token.release()
+
+    def lookup(self, name):
+        # Blind index: hash the name and compare it with the plaintext record tags.
+        # Neither the names nor the offset index are decrypted; only the matching
+        # record is, and its decrypted name is checked to rule out a collision.
+        if not self.blind_key or self.stored_format() != "log":
+            return self.get(name)
+        with self.lock:
+            tags = self._tag_map()
+            if tags is None:
+                return self.get(name) # version 1 log, no tags yet
+            entry = tags.get(blind_tag(self.blind_key, name))
+            if entry is None:
+                # Records written without a blind key carry an all-zero tag
+                return self.get(name) if bytes(_TAG_SIZE) in tags else None
+            record = self._read_record(*entry)
+        if record.get("k") != name or record.get("d"):
+            return None
+        return record["v"]
+
+    def _tag_map(self):
+        # Built from the record headers only; the last record for a tag wins
+        # (a tombstone hides the earlier value).
+        with self.lock:
+            if self._tags is None:
+                mapped = self._open_map()
+                if record_header_size(mapped) == _LEN.size:
+                    return None
+                tags = {}
+                for offset, start, end in iter_log(mapped):
+                    tags[mapped[start - _TAG_SIZE:start]] = (offset, end)
+                self._tags = tags
+            return self._tags
+
+    def stored_format(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            return detect_format(f.read(len(LOG_MAGIC)))
+
+    def lazy_view(self):
+        if self.stored_format() != "log":
+            return None
+        self._read_index()
+        return LazyCredentials(self)
+
+class ShardedVault(Vault):
+    # Each shard is a normal single-token payload of the names that hash to it. A
+    # save of a few names rewrites only their shards, so the other shard files keep
+    # their bytes and Git history grows by the changed shards only. Loading
+    # decrypts the shards in parallel on backends with decrypt_many.
+    def __init__(self, path, fernet, fmt="sharded", blind_key=None, compression=None, level=None, serialization=None, shards=None):
+        super().__init__(path, fernet, "sharded", blind_key, compression, level, serialization, shards)
+        self.shard_dir = path + ".shards"
+
+    def shard_path(self, i):
+        return os.path.join(self.shard_dir, f"{i:02d}.dat")
+
+    def manifest(self):
+        # (shard count, [digest per shard] or None for a version 1 manifest), or
+        # None when the file is not sharded
+        blob = self.read_blob()
+        if detect_format(blob) != "sharded":
+            return None
+        version = blob[len(_SHARD_PREFIX)]
+        count = _SHARD_COUNT.unpack_from(blob, len(SHARD_MAGIC))[0]
+        if version == 1:
+            return count, None
+        if version != SHARD_MAGIC[-1]:
+            raise ValueError(f"Unsupported shard manifest version: {version}")
+        start = len(SHARD_MAGIC) + _SHARD_COUNT.size
+        if len(blob) < start + 32 * count:
+            raise ValueError("Truncated shard manifest.")
+        return count, [bytes(blob[start + 32 * i:start + 32 * (i + 1)]) for i in range(count)]
+
+    def shard_count(self):
+        # The manifest wins over the configured count: existing files keep their layout
+        manifest = self.manifest()
+        return manifest[0] if manifest else None
+
+    def _read_shard(self, i, digests):
+        # The shard's token, None if it is empty; raises if it is not the expected file
+        path = self.shard_path(i)
+        expected = digests[i] if digests else None
+        if not os.path.exists(path):
+            if expected not in (None, _NO_SHARD):
+                raise ValueError(f"Vault shard {i:02d} is missing: {path}")
+            return None
+        with open(path, 'rb') as f:
+            token = f.read()
+        if expected is not None and hashlib.sha256(token).digest() != expected:
+            raise ValueError(f"Vault shard {i:02d} does not match the manifest: {path}")
+        return token
+
+    def _shard_digest(self, i):
+        path = self.shard_path(i)
+        if not os.path.exists(path):
+            return _NO_SHARD
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).digest()
+
+    def load(self):
+        manifest = self.manifest()
+        if manifest is None:
+            return super().load() # single-token vault: the first write shards it
+        count, digests = manifest
+        tokens = [self._read_shard(i, digests) for i in range(count)]
+        tokens = [token for token in tokens if token is not None]
+        data = {}
+        for plain in self._decrypt_all(tokens):
+            data.update(serialize.loads(decompress_payload(plain)))
+        return data
+
+    def _decrypt_all(self, tokens):
+        if len(tokens) > 1 and hasattr(self.fernet, "decrypt_many") and sum(map(len, tokens)) >= PARALLEL_BYTES:
+            results = self.fernet.decrypt_many([base64.urlsafe_b64encode(t) for t in tokens],
+                                               workers=min(len(tokens), os.cpu_count() or 1))
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            return results
+        return [decrypt_token(self.fernet, token) for token in tokens]
+
+    def save(self, data):
+        # Full rewrite; also the point where a new "vault_shards" setting takes effect
+        self._write(data, self.shards, range(self.shards))
+
+    def apply(self, data, updates=(), deletes=()):
+        count = self.shard_count()
+        if count is None:
+            return self.save(data)
+        touched = {shard_of(name, count) for name in updates}
+        touched.update(shard_of(name, count) for name in deletes)
+        self._write(data, count, touched)
+
+    def _write(self, data, count, touched):
+        groups = {i: {} for i in touched}
+        for name, value in data.items():
+            i = shard_of(name, count)
+            if i in groups:
+                groups[i][name] = value
+        current = self.manifest()
+        if current is not None and current[0] == count and current[1] is not None:
+            digests = list(current[1])
+        else:
+            digests = [self._shard_digest(i) for i in range(count)] # new layout or version 1 manifest
+        os.makedirs(self.shard_dir, exist_ok=True)
+        for i, items in groups.items():
+            if items:
+                token = dump_payload(self.fernet, items, "binary", self.compression, self.level, self.serialization)
+                atomic_write(self.shard_path(i), token)
+                digests[i] = hashlib.sha256(token).digest()
+            else:
+                if os.path.exists(self.shard_path(i)):
+                    os.remove(self.shard_path(i))
+                digests[i] = _NO_SHARD
+        # Manifest last: until it is replaced, readers still see the old layout
+        atomic_write(self.path, SHARD_MAGIC + _SHARD_COUNT.pack(count) + b"".join(digests))
+        if current is None or current[0] != count:
+            self.remove_shards(count)
+
+    def remove_shards(self, start):
+        # Drops shard files numbered `start` and up (after resharding or converting away)
+        if not os.path.isdir(self.shard_dir):
+            return
+        for entry in os.listdir(self.shard_dir):
+            stem = entry.split(".")[0]
+            if stem.isdigit() and int(stem) >= start:
+                os.remove(os.path.join(self.shard_dir, entry))
+        if not os.listdir(self.shard_dir):
+            os.rmdir(self.shard_dir)
+
+    # A single name only needs its own shard
+    def get(self, name):
+        manifest = self.manifest()
+        if manifest is None:
+            return super().get(name)
+        count, digests = manifest
+        token = self._read_shard(shard_of(name, count), digests)
+        if token is None:
+            return None
+        return load_payload(self.fernet, token).get(name)
+
+class SplitVault(Vault):
+    # Names (with a modified time each) and secrets are encrypted separately, so a
+    # session lists and searches from the metadata alone and decrypts a password
+    # when it is read. Rewrites copy the unchanged secret tokens as they are and
+    # only encrypt the values that changed.
+    def __init__(self, path, fernet, fmt="split", blind_key=None, compression=None, level=None, serialization=None, shards=None):
+        super().__init__(path, fernet, "split", blind_key, compression, level, serialization, shards)
+        self._meta = None
+        self._base = 0
+        self._stamp = None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def metadata(self):
+        # {name: [offset, length, modified, digest]}; re-read when the file changed on disk
+        # (e.g. git pull). None if the file is not in the split layout.
+        stamp = self._file_stamp()
+        if self._meta is not None and stamp == self._stamp:
+            return self._meta
+        self._meta = None
+        if stamp is None:
+            return None
+        with open(self.path, 'rb') as f:
+            head = f.read(len(SPLIT_MAGIC) + _LEN.size)
+            if head[:len(SPLIT_MAGIC)] != SPLIT_MAGIC:
+                return None
+            (length,) = _LEN.unpack_from(head, len(SPLIT_MAGIC))
+            self._meta = load_payload(self.fernet, f.read(length))
+        self._base = len(head) + length
+        self._stamp = stamp
+        return self._meta
+
+    def _read_secret(self, f, entry):
+        f.seek(self._base + entry[0])
+        token = f.read(entry[1])
+        if len(entry) > 3 and hashlib.sha256(token).hexdigest() != entry[3]:
+            raise ValueError("Split vault secret does not match its metadata entry.")
+        return json.loads(decrypt_token(self.fernet, token))
+
+    def load(self):
+        meta = self.metadata()
+        if meta is None:
+            return super().load() # other layout: the first write splits it
+        with open(self.path, 'rb') as f:
+            return {name: self._read_secret(f, entry) for name, entry in meta.items()}
+
+    def names(self):
+        meta = self.metadata()
+        return list(meta) if meta is not None else super().names()
+
+    def get(self, name):
+        meta = self.metadata()
+        if meta is None:
+            return super().get(name)
+        entry = meta.get(name)
+        if entry is None:
+            return None
+        with open(self.path, 'rb') as f:
+            return self._read_secret(f, entry)
+
+    def lazy_view(self):
+        if self.metadata() is None:
+            return None
+        return LazyCredentials(self)
+
+    def save(self, data):
+        self._write(data, None)
+
+    def apply(self, data, updates=(), deletes=()):
+        self._write(data, set(updates))
+
+    def _write(self, data, changed):
+        # `changed` None re-encrypts every value; otherwise only those names (and
+        # names that have no token yet), the rest are copied byte for byte.
+        old_meta = self.metadata() or {}
+        old_blob = memoryview(self.read_blob())[self._base:] if old_meta else b""
+        now = time.time()
+        tokens = []
+        meta = {}
+        offset = 0
+        for name in list(data):
+            entry = old_meta.get(name)
+            if changed is not None and name not in changed and entry is not None:
+                token = old_blob[entry[0]:entry[0] + entry[1]]
+                modified = entry[2]
+            else:
+                token = encrypt_token(self.fernet, json.dumps(data[name]).encode(), "binary")
+                modified = now
+            meta[name] = [offset, len(token), modified, hashlib.sha256(token).hexdigest()]
+            tokens.append(token)
+            offset += len(token)
+
+        head = dump_payload(self.fernet, meta, "binary", self.compression, self.level)
+        out = bytearray(SPLIT_MAGIC)
+        out += _LEN.pack(len(head))
+        out += head
+        for token in tokens:
+            out += token
+        atomic_write(self.path, out)
+        self._meta = meta
+        self._base = len(SPLIT_MAGIC) + _LEN.size + len(head)
+        self._stamp = self._file_stamp()
+
+# Write-behind journal: "<path>.journal" uses the log layout (LOG_MAGIC + records).
+# It only exists while a BufferedVault has changes that are not in the vault yet.
+_buffered = {} # path -> live BufferedVault
+
+def flush_buffers():
+    # Writes every pending write-behind change (e.g. before the files are synced)
+    for buffered in list(_buffered.values()):
+        buffered.flush()
+
+def journal_path(path):
+    return path + ".journal"
+
+def append_journal(path, records):
+    new = not os.path.exists(path)
+    with open(path, 'ab') as f:
+        if new:
+            f.write(LOG_MAGIC)
+        f.write(records)
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_journal(path, fernet):
+    # Decrypted journal records in write order (a torn last record is ignored)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        blob = f.read()
+    if detect_format(blob) != "log":
+        return []
+    view = memoryview(blob)
+    return [load_payload(fernet, view[start:end]) for _, start, end in iter_log(blob)]
+
+def recover_journal(store):
+    # Crash recovery: changes a write-behind vault journaled but never flushed are
+    # applied to the vault, then the journal is removed. Returns True if it ran.
+    path = journal_path(store.path)
+    records = read_journal(path, store.fernet)
+    if records is None:
+        return False
+    if records:
+        data = store.load()
+        changes = {}
+        for record in records:
+            if record.get("d"):
+                data.pop(record["k"], None)
+                changes[record["k"]] = False
+            else:
+                data[record["k"]] = record["v"]
+                changes[record["k"]] = True
+        store.apply(data,
+                    updates=[name for name, written in changes.items() if written],
+                    deletes=[name for name, written in changes.items() if not written])
+    os.remove(path)
+    return True
+
+class BufferedVault:
+    # Optional write-behind mode (pm_config.json: "write_behind" = debounce seconds).
+    # apply() only appends the change to a small fsynced journal and marks the names
+    # dirty; changes made less than `delay` seconds apart are written to the vault
+    # by one apply() of the wrapped vault (one full rewrite for single-token
+    # formats). Pending changes are also flushed on close() and at interpreter exit;
+    # after a crash the journal is replayed by the next open_vault().
+    # Everything else is delegated to the wrapped vault.
+    def __init__(self, inner, delay):
+        self.inner = inner
+        self.delay = delay
+        self.journal_path = journal_path(inner.path)
+        # The flush timer runs on its own thread: a VaultSession shares this lock
+        # so a flush never sees the credentials dict halfway through an update, and
+        # it is the wrapped vault's own lock so lazy reads never see a closed mmap.
+        self.lock = getattr(inner, "lock", None) or threading.RLock()
+        self._data = None
+        self._dirty = {} # name -> True (written) / False (deleted)
+        self._timer = None
+        _buffered[inner.path] = self
+        atexit.register(self.flush)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def apply(self, data, updates=(), deletes=()):
+        with self.lock:
+            records = [encode_record(self.inner.fernet, name, data[name], blind_key=self.inner.blind_key) for name in updates]
+            records += [encode_record(self.inner.fernet, name, deleted=True, blind_key=self.inner.blind_key) for name in deletes]
+            append_journal(self.journal_path, b"".join(records))
+            self._data = data
+            self._dirty.update(dict.fromkeys(updates, True))
+            self._dirty.update(dict.fromkeys(deletes, False))
+            # Debounce: every write pushes the flush back by `delay`
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            self.inner.apply(self._data,
+                             updates=[name for name, written in self._dirty.items() if written],
+                             deletes=[name for name, written in self._dirty.items() if not written])
+            self._dirty.clear()
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+    def save(self, data):
+        # Full rewrite supersedes anything pending
+        with self.lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty.clear()
+            self.inner.save(data)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+    # Reads that bypass the session's in-memory data see pending writes first
+    def load(self):
+        self.flush()
+        return self.inner.load()
+
+    def lazy_view(self):
+        self.flush()
+        return self.inner.lazy_view()
+
+    def get(self, name):
+        self.flush()
+        return self.inner.get(name)
+
+    def lookup(self, name):
+        self.flush()
+        return self.inner.lookup(name)
+
+    def names(self):
+        self.flush()
+        return self.inner.names()
+
+    def close(self):
+        self.flush()
+        self._data = None
+        if _buffered.get(self.inner.path) is self:
+            del _buffered[self.inner.path]
+        atexit.unregister(self.flush)
+        self.inner.close()
@@ -1,11 +1,11 @@
 import os
-import json
 import random
 import time
 import datetime
 import io
 import getpass
 import csv
+import sys
 
 # Imports are already correct at the top.
 # The previous edit pasted code into the global scope.
@@ -13,49 +13,21 @@ import csv
 try:
     import pyotp
     import qrcode
-    from cryptography.fernet import Fernet
-    from cryptography.hazmat.primitives import hashes
-    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 except ImportError:
     print("Standard libraries not found. Attempting to use local pure-python fallbacks...")
     try:
         from libs import pure_otp as pyotp
-        from libs.pure_fernet import Fernet
         qrcode = None # Optional for Termux
         print("Success: Using local pure-python libraries (Portable Mode).")
     except ImportError as e:
         print(f"Error: Missing dependency {e}. Please run 'pip install -r requirements.txt'")
         exit(1)
 
+from libs import delta
+from libs.core import AutoSync, ConfigManager, GitSync
+from libs import pure_otp
+from libs import search
 
-class GitSync:
-    @staticmethod
-    def push_data():
-        print("Syncing: Uploading changes to Cloud (Git)...")
-        try:
-            # Stage everything
-            os.system("git add .")
-            # Commit
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            os.system(f'git commit -m "Auto-Sync: {timestamp}"')
-            # Push
-            if os.system("git push") == 0:
-                print("Success: Data uploaded.")
-            else:
-                print("Error: Push failed. Check your internet or git config.")
-        except Exception as e:
-            print(f"Sync Error: {e}")
-
-    @staticmethod
-    def pull_data():
-        print("Syncing: Downloading changes from Cloud (Git)...")
-        try:
-            if os.system("git pull") == 0:
-                print("Success: Data updated.")
-            else:
-                print("Error: Pull failed.")
-        except Exception as e:
-            print(f"Sync Error: {e}")
 
 class RailFence:
     @staticmethod
@@ -151,39 +123,12 @@ class Utils:
     def clear_screen():
         os.system('cls' if os.name == 'nt' else 'clear')
 
-class ConfigManager:
-    def __init__(self, config_path="pm_config.json", key_path="key.key"):
-        self.config_path = config_path
-        self.key_path = key_path
-        self.config = {}
-        self.fernet = None
-
-    def load(self):
-        if not os.path.exists(self.config_path):
-            return False
-        with open(self.config_path, 'r') as f:
-            self.config = json.load(f)
-        
-        if os.path.exists(self.key_path):
-            with open(self.key_path, 'rb') as k:
-                key = k.read()
-                self.fernet = Fernet(key)
-        return True
-
-    def save(self):
-        with open(self.config_path, 'w') as f:
-            json.dump(self.config, f, indent=4)
-
-    def generate_key(self):
-        key = Fernet.generate_key()
-        with open(self.key_path, 'wb') as k:
-            k.write(key)
-        self.fernet = Fernet(key)
-
 class App:
     def __init__(self):
         self.cm = ConfigManager()
         self.is_setup = self.cm.load()
+        self.vault_session = None
+        self.auto_sync = AutoSync.from_config(self.cm, syncer=self.syncer())
 
     def run_railfence_challenge(self):
         print("\n--- SECURITY CHALLENGE (Rail Fence Cipher) ---")
@@ -235,9 +180,9 @@ class App:
                 print("  - Solution: You MUST copy 'pm_config.json' from your PC to this folder.")
             return False
             
-        totp = pyotp.TOTP(secret)
+        verifier = self.cm.otp_verifier()
         user_code = input("Enter OTP from Authenticator: ")
-        if totp.verify(user_code, valid_window=1):
+        if verifier.verify(user_code) is not None:
             print("OTP Verified.")
             return True
         else:
@@ -280,17 +225,23 @@ class App:
         
         totp = pyotp.TOTP(secret)
         current_otp = totp.now()
+        # valid_window=8 allows for +/- 4 minutes of drift; codes are cached between attempts
+        verifier = pure_otp.TOTPVerifier(secret, valid_window=8)
         
     #    print(f"DEBUG/SYNC CHECK: The PC expects the code: [ {current_otp} ]")
         print("Check your phone. If it matches, great! If it's different, your PC clock is likely out of sync.")
         print("You can enter the code from your phone OR the code shown above to verify.")
         
+        setup_drift = 0
         while True:
             code = input("Enter the code: ").strip()
             
-            # valid_window=8 allows for +/- 4 minutes of drift
-            if totp.verify(code, valid_window=8):
+            drift = verifier.verify(code)
+            if drift is not None:
                 print("Authenticator verified successfully!")
+                if drift:
+                    print(f"Note: your phone clock is {drift * 30:+d}s off from this PC. Offset saved.")
+                setup_drift = drift
                 break
             elif code == current_otp:
                  print("Authenticator verified (Manual Sync Match)!")
@@ -317,54 +268,117 @@ class App:
         self.cm.config = {
             "otp_secret": secret,
             "data_path": storage_path,
+            "otp_drift": setup_drift,
             "setup_complete": True
         }
         self.cm.save()
         
-        # Initialize empty data file
+        # Initialize empty data file (new key: any unlocked session is stale)
+        self.lock()
         self.save_credentials({})
         
         print("\nSetup Complete!")
         time.sleep(2)
         self.is_setup = True
 
+    def resolve_data_path(self):
+        # ConfigManager.resolve_data_path() with diagnostics; None if no vault file exists
+        configured = self.cm.config.get("data_path")
+        path = self.cm.resolve_data_path()
+        if path != configured:
+            print(f"[Debug] Configured path not found: {configured}")
+            print(f"[Debug] Found local backup: {path}. Using it.")
+        elif not path or not os.path.exists(path):
+            print(f"[Debug] Configured path not found: {configured}")
+            print(f"[Error] Credential file not found.")
+            return None
+        return path
+
     def get_credentials(self):
-        path = self.cm.config.get("data_path")
-        
-        if not os.path.exists(path):
-            print(f"[Debug] Configured path not found: {path}")
-            # Fallback: Check if file exists in current directory
-            local_name = os.path.basename(path)
-            if os.path.exists(local_name):
-                 print(f"[Debug] Found local backup: {local_name}. Using it.")
-                 path = local_name
-            else:
-                 print(f"[Error] Credential file not found.")
-                 return {}
-        
-        with open(path, 'rb') as f:
-            encrypted_data = f.read()
+        path = self.resolve_data_path()
+        if not path:
+            return {}
         
         try:
-            decrypted_data = self.cm.fernet.decrypt(encrypted_data)
-            return json.loads(decrypted_data)
+            return self.open_vault(path).load()
         except Exception as e:
             print(f"[Critical] Decryption failed: {e}")
             print("Ensure you have the correct 'key.key' file.")
             return {}
 
     def save_credentials(self, data):
-        path = self.cm.config.get("data_path")
-        json_data = json.dumps(data)
-        encrypted_data = self.cm.fernet.encrypt(json_data.encode())
-        with open(path, 'wb') as f:
-            f.write(encrypted_data)
+        self.open_vault().save(data)
+        self.changed()
+
+    def syncer(self):
+        return self.cm.syncer()
+
+    def history_paths(self):
+        # Files a sync commit may touch (the only commits compaction squashes)
+        return self.cm.sync_paths() + [delta.DEFAULT_CHANGES_DIR]
+
+    def changed(self, names=None):
+        # A vault file was written (`names` in the credential vault, None: unknown):
+        # delta sync stamps the edit time, the auto-sync scheduler batches it
+        self.cm.record_edit(names)
+        if self.auto_sync:
+            self.auto_sync.notify()
+
+    def open_vault(self, path=None, write=True):
+        return self.cm.open_vault(path, write)
+
+    def unlock(self):
+        # One OTP check unlocks the vault in memory for "session_ttl" idle seconds;
+        # actions in between skip the OTP prompt and the file decryption.
+        # Returns the credentials dict, or None if verification/decryption failed.
+        if self.vault_session and self.vault_session.is_unlocked():
+            return self.vault_session.data
+        if not self.verify_otp():
+            return None
+        try:
+            self.vault_session = self.cm.open_session(on_change=self.changed)
+        except Exception as e:
+            print(f"[Critical] Decryption failed: {e}")
+            print("Ensure you have the correct 'key.key' file.")
+            self.vault_session = None
+            return None
+        return self.vault_session.data
+
+    def lookup(self, name):
+        # Scripted exact lookup: `python main.py get "<service>"` prints only the password.
+        # Log vaults find the record by its blind tag and decrypt nothing else.
+        if not self.is_setup or not self.cm.fernet:
+            print("Not set up. Run the CLI and choose Initial Setup first.")
+            return False
+        if not self.verify_otp():
+            return False
+        path = self.resolve_data_path()
+        if not path:
+            return False
+        store = self.open_vault(path, write=False)
+        try:
+            password = store.lookup(name)
+        except Exception as e:
+            print(f"[Critical] Decryption failed: {e}")
+            return False
+        finally:
+            store.close()
+        if password is None:
+            print(f"No credential named '{name}'.")
+            return False
+        print(password)
+        return True
+
+    def lock(self):
+        if self.vault_session:
+            self.vault_session.lock()
+            self.vault_session = None
 
     def add_credential(self):
-        if not self.verify_otp(): # Standard says "encryption" but let's secure write access
+        creds = self.unlock() # Standard says "encryption" but let's secure write access
+        if creds is None:
              return
              
-        creds = self.get_credentials()
         username = input("Enter Username/Service Name: ")
         password = getpass.getpass("Enter Password: ")
         
@@ -372,9 +386,10 @@ class App:
              if input("Credential exists. Overwrite? (y/n): ").lower() != 'y':
                  return
         
-        creds[username] = password
-        self.save_credentials(creds)
-        print("Credential saved.")
+        if self.vault_session.put(username, password):
+            print("Credential saved.")
+        else:
+            print("Session expired. No changes made.")
 
     def update_authenticator(self):
         print("Requesting Rail Fence Challenge verification before change...")
@@ -411,12 +426,86 @@ class App:
         else:
             print("Verification failed. No changes made.")
 
+    def calibrate_authenticator(self):
+        secret = self.cm.config.get("otp_secret")
+        if not secret:
+            print("No authenticator configured. Run the initial setup first.")
+            return
+        print("Requesting Rail Fence Challenge verification before calibration...")
+        if not self.run_railfence_challenge():
+            return
+
+        print("\nThis finds how far your phone's clock is off (up to +/- 24 hours).")
+        first = input("Enter the code currently shown in your Authenticator app: ").strip()
+        print("Wait for the app to show the NEXT code, then enter it (recommended).")
+        second = input("Next code [Enter to skip]: ").strip()
+        codes = [first] + ([second] if second else [])
+
+        drift = pure_otp.calibrate_drift(secret, codes)
+        if drift is None:
+            print("Could not match these codes within +/- 24 hours. No changes made.")
+            return
+        self.cm.config["otp_drift"] = drift
+        self.cm.save()
+        print(f"Authenticator clock offset: {drift * 30:+d}s ({drift:+d} steps). Saved.")
+
+    def authenticator_menu(self):
+        print("Verify Identity to Open Authenticator...")
+        if self.unlock() is None:
+            return
+
+        store = self.cm.open_authenticator()
+        try:
+            accounts = store.load()
+        except Exception as e:
+            print(f"[Critical] Could not read authenticator file: {e}")
+            return
+        # Codes for every account are generated once per 30s tick, not per redraw
+        board = pure_otp.CodeBoard(accounts)
+
+        while True:
+            Utils.clear_screen()
+            codes = board.codes()
+            print("=== AUTHENTICATOR CODES ===")
+            if not codes:
+                print("No accounts added yet.")
+            for name in board.names():
+                print(f"{codes[name]}   {name}")
+            print(f"\n(Codes change in {board.seconds_left()}s)")
+            print("r. Refresh")
+            print("a. Add Account")
+            print("d. Remove Account")
+            print("b. Back to Main Menu")
+
+            sub = input("\nSelect Option: ").lower()
+            if sub == 'a':
+                name = input("Service Name: ").strip()
+                secret = getpass.getpass("Setup Key (base32 secret): ").replace(" ", "").upper()
+                if not name or not secret:
+                    continue
+                try:
+                    board.add(name, secret)
+                except Exception:
+                    input("Invalid setup key. Press Enter to continue...")
+                    continue
+                accounts[name] = secret
+                store.save(accounts)
+                self.changed(())
+            elif sub == 'd':
+                name = input("Service Name to remove: ").strip()
+                if name in accounts and input(f"Remove '{name}'? (y/n): ").lower() == 'y':
+                    del accounts[name]
+                    board.remove(name)
+                    store.save(accounts)
+                    self.changed(())
+            elif sub == 'r' or sub == '':
+                continue
+            else:
+                break
+
     def update_credentials(self):
         print("Verify Identity to Edit Credentials...")
-        if not self.verify_otp():
-            return
-            
-        self.add_credential() # Reuse logic
+        self.add_credential() # Reuse logic (unlocks the session if needed)
 
     def update_path_location(self):
         if not self.run_railfence_challenge():
@@ -429,8 +518,38 @@ class App:
         self.cm.config["data_path"] = new_path
         self.cm.save()
         self.save_credentials(current_data)
+        self.lock() # Session points at the old file
         print(f"Data moved to {new_path}")
 
+    def convert_vault_format(self):
+        print("Verify Identity to Change Vault Format...")
+        if self.unlock() is None:
+            return
+
+        store = self.open_vault()
+        current = store.stored_format() or store.format
+        print(f"Current vault format: {current}")
+        print("1. base64 (Legacy, text)")
+        print("2. binary (Compact, ~25% smaller)")
+        print("3. log (One record per credential, fast single writes)")
+        print("4. sharded (Split into files by service, small Git syncs)")
+        print("5. split (Names and passwords encrypted apart, listing reveals nothing)")
+        choice = input("Select Format: ").strip()
+        fmt = {"1": "base64", "2": "binary", "3": "log", "4": "sharded", "5": "split"}.get(choice)
+        if not fmt:
+            print("Invalid option.")
+            return
+
+        try:
+            store.convert(fmt)
+        except Exception as e:
+            print(f"Error converting vault: {e}")
+            return
+        self.cm.config["vault_format"] = fmt
+        self.cm.save()
+        self.lock() # Reopen with the new format on next use
+        print(f"Vault converted to {fmt} format.")
+
     def get_password(self):
         search_query = input("Enter username or service to search: ")
         
@@ -438,23 +557,26 @@ class App:
         if not self.run_railfence_challenge():
             return
             
-        # 2. Second Challenge (OTP)
-        if not self.verify_otp():
+        # 2. Second Challenge (OTP, skipped while the session is unlocked)
+        creds = self.unlock()
+        if creds is None:
             return
             
-        creds = self.get_credentials()
-        found = False
-        for k, v in creds.items():
-            if search_query.lower() in k.lower():
-                print(f"Found: {k} -> {v}") # In real app, maybe copy to clipboard
-                found = True
-        
-        if not found:
+        # Ranked substring matches from the session's trigram index; only the
+        # matching entries are decrypted (indexed vaults decrypt lazily)
+        matches = self.vault_session.search(search_query, fuzzy=False)
+        for k in matches:
+            print(f"Found: {k} -> {creds[k]}") # In real app, maybe copy to clipboard
+        
+        if not matches:
             print("No matching credentials found.")
+            suggestions = self.vault_session.search(search_query, limit=5)
+            if suggestions:
+                print("Did you mean: " + ", ".join(suggestions))
 
     def bulk_import(self):
         print("Verify Identity to Import Credentials...")
-        if not self.verify_otp():
+        if self.unlock() is None:
             return
 
         default_csv = "credentials_import.csv"
@@ -467,7 +589,7 @@ class App:
              return
              
         try:
-            current_creds = self.get_credentials()
+            imported = {}
             count = 0
             with open(csv_path, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
@@ -489,11 +611,13 @@ class App:
                         # But we wrote the CSV with headers "Service,Password" so it should work.
                         continue
                         
-                    current_creds[key] = value
+                    imported[key] = value
                     count += 1
             
-            self.save_credentials(current_creds)
-            print(f"Successfully imported {count} credentials.")
+            if self.vault_session.put_many(imported):
+                print(f"Successfully imported {count} credentials.")
+            else:
+                print("Session expired. No changes made.")
             
         except Exception as e:
             print(f"Error importing CSV: {e}")
@@ -503,48 +627,73 @@ class App:
         # Since listing usernames is less sensitive than passwords, 
         # but still private, we should at least check they have access.
         # User said "show usernames only if user want to show" implying a toggle or action.
-        if not self.verify_otp():
+        creds = self.unlock()
+        if creds is None:
             return
-            
              
-        creds = self.get_credentials()    
         if not creds:
              print("No credentials stored.")
              return
              
-        sorted_keys = sorted(creds.keys())
-        print("\n=== Stored Services / Usernames ===")
-        for i, service in enumerate(sorted_keys, 1):
-            print(f"{i}. {service}")
-        print("===================================")
-        
-        choice = input("\nEnter tag number to reveal password (or 0/Enter to go back): ").strip()
-        if not choice or choice == '0':
+        selected_service = self.pick_service("Stored Services / Usernames", "\nEnter tag number to reveal password (or 0/Enter to go back): ")
+        if selected_service is None:
             return
-            
-        try:
-            idx = int(choice) - 1
-            if 0 <= idx < len(sorted_keys):
-                selected_service = sorted_keys[idx]
                 
-                # Security Check before revealing password
-                # They already passed OTP to see the list via verify_otp() above.
-                # Let's verify Knowledge (Rail Fence) now to match get_password security level.
-                if not self.run_railfence_challenge():
-                    return
-                
-                print(f"\nServiceName: {selected_service}")
-                print(f"Password:    {creds[selected_service]}")
-                input("\nPress Enter to clear screen and continue...")
-                Utils.clear_screen()
+        # Security Check before revealing password
+        # They already passed OTP to see the list via unlock() above.
+        # Let's verify Knowledge (Rail Fence) now to match get_password security level.
+        if not self.run_railfence_challenge():
+            return
+        
+        if not self.vault_session.is_unlocked():
+            print("Session expired. Please try again.")
+            return
+        print(f"\nServiceName: {selected_service}")
+        print(f"Password:    {creds.get(selected_service)}")
+        input("\nPress Enter to clear screen and continue...")
+        Utils.clear_screen()
+
+    def pick_service(self, title, prompt):
+        # Numbered picker over the session's sorted names, one page at a time
+        # (pm_config.json: "page_size"). Numbers run on across pages.
+        # Returns the chosen name, or None if cancelled or invalid.
+        size = self.cm.config.get("page_size", search.DEFAULT_PAGE_SIZE)
+        page = 0
+        while True:
+            if not self.vault_session.is_unlocked():
+                print("Session expired. Please try again.")
+                return None
+            pages = self.vault_session.page_count(size)
+            page = min(page, pages - 1)
+            print(f"\n=== {title} ===")
+            for i, service in enumerate(self.vault_session.page(page, size), page * size + 1):
+                print(f"{i}. {service}")
+            if pages > 1:
+                print(f"--- Page {page + 1}/{pages}: n = next, p = previous ---")
             else:
+                print("=" * (len(title) + 8))
+
+            choice = input(prompt).strip().lower()
+            if choice in ('n', 'p'):
+                page = max(0, page + (1 if choice == 'n' else -1))
+                continue
+            if not choice or choice == '0':
+                return None
+            try:
+                idx = int(choice) - 1
+            except ValueError:
+                print("Invalid input.")
+                return None
+            names = self.vault_session.page(idx // size, size) if 0 <= idx < pages * size else []
+            if idx % size >= len(names):
                 print("Invalid number.")
-        except ValueError:
-            print("Invalid input.")
+                return None
+            return names[idx % size]
 
     def export_csv(self):
         print("Verify Identity to Export Credentials...")
-        if not self.verify_otp():
+        creds = self.unlock()
+        if creds is None:
             return
             
         default_path = "exported_credentials.csv"
@@ -552,7 +701,6 @@ class App:
         if not path:
             path = default_path
             
-        creds = self.get_credentials()
         try:
             with open(path, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
@@ -565,7 +713,8 @@ class App:
 
     def remove_credential(self):
         print("Verify Identity to Remove Credentials...")
-        if not self.verify_otp():
+        creds = self.unlock()
+        if creds is None:
             return
             
         print("\n=== REMOVE OPTIONS ===")
@@ -574,36 +723,22 @@ class App:
         
         choice = input("Select Option: ").strip()
         
-        creds = self.get_credentials()
-        
         if choice == '1':
             if not creds:
                 print("No credentials to remove.")
                 return
                 
-            sorted_keys = sorted(creds.keys())
-            print("\n=== Select Service to Remove ===")
-            for i, service in enumerate(sorted_keys, 1):
-                print(f"{i}. {service}")
-            
-            sel = input("\nEnter tag number (or 0 to cancel): ").strip()
-            if not sel or sel == '0':
+            target = self.pick_service("Select Service to Remove", "\nEnter tag number (or 0 to cancel): ")
+            if target is None:
                  return
                  
-            try:
-                idx = int(sel) - 1
-                if 0 <= idx < len(sorted_keys):
-                    target = sorted_keys[idx]
-                    if input(f"Are you sure you want to delete '{target}'? (type 'yes' to confirm): ").lower() == 'yes':
-                        del creds[target]
-                        self.save_credentials(creds)
-                        print("Credential removed.")
-                    else:
-                        print("Cancelled.")
+            if input(f"Are you sure you want to delete '{target}'? (type 'yes' to confirm): ").lower() == 'yes':
+                if self.vault_session.delete(target):
+                    print("Credential removed.")
                 else:
-                    print("Invalid number.")
-            except ValueError:
-                print("Invalid input.")
+                    print("Session expired. No changes made.")
+            else:
+                print("Cancelled.")
                 
         elif choice == '2':
             print("\n!!! DANGER: THIS WILL WIPE ALL SAVED CREDENTIALS !!!")
@@ -614,8 +749,10 @@ class App:
                 
             confirm = input("Type 'DELETE ALL' to confirm: ")
             if confirm == 'DELETE ALL':
-                 self.save_credentials({})
-                 print("All credentials have been wiped.")
+                 if self.vault_session.replace({}):
+                     print("All credentials have been wiped.")
+                 else:
+                     print("Session expired. No changes made.")
             else:
                  print("Incorrect confirmation string. Aborted.")
         else:
@@ -630,6 +767,7 @@ class App:
             print("3. Data Management (Import / Export)")
             print("4. Settings & Setup")
             print("5. Cloud Sync (Git)")
+            print("6. Authenticator Codes (2FA for your services)")
             print("q. Quit")
             
             choice = input("\nSelect Option: ").lower()
@@ -688,7 +826,9 @@ class App:
                     print("a. New Initial Setup")
                     print("b. Update Authenticator")
                     print("c. Update Storage Path")
-                    print("d. Back to Main Menu")
+                    print("d. Convert Vault Format (Base64 / Binary / Log)")
+                    print("e. Calibrate Authenticator Clock")
+                    print("f. Back to Main Menu")
                     
                     sub = input("\nSelect Option: ").lower()
                     if sub == 'a':
@@ -696,7 +836,9 @@ class App:
                             self.initial_setup()
                     elif sub == 'b': self.update_authenticator()
                     elif sub == 'c': self.update_path_location()
-                    elif sub == 'd': break
+                    elif sub == 'd': self.convert_vault_format()
+                    elif sub == 'e': self.calibrate_authenticator()
+                    elif sub == 'f': break
                     else: break
                     input("Press Enter to continue...")
             
@@ -704,16 +846,39 @@ class App:
                 print("Select Mode:")
                 print("1. Push (Upload Local Changes)")
                 print("2. Pull (Download Cloud Changes)")
+                print("3. Compact History (squash old syncs, repack)")
                 syn = input("Choice: ")
-                if syn == '1': GitSync.push_data()
-                elif syn == '2': GitSync.pull_data()
+                if syn == '1': GitSync.push_data(self.cm.sync_paths(), self.syncer(), self.cm.watch_paths())
+                elif syn == '2':
+                    self.lock() # the vault on disk is about to change
+                    GitSync.pull_data(self.cm.sync_paths(), self.syncer(), self.cm.watch_paths())
+                elif syn == '3':
+                    if self.auto_sync and self.auto_sync.pending():
+                        self.auto_sync.sync() # nothing may be left to push on the old history
+                    GitSync.compact_data(self.cm.config, self.history_paths())
+                input("Press Enter to continue...")
+
+            elif choice == '6':
+                self.authenticator_menu()
             
             elif choice == 'q':
+                self.lock()
+                self.flush_sync()
                 break
             else:
                 input("Invalid option. Press Enter to continue...")
                 continue
 
+    def flush_sync(self):
+        # Pending auto-sync changes go out before the app exits
+        if self.auto_sync and self.auto_sync.pending():
+            print("Auto-Sync: uploading pending changes...")
+            result = self.auto_sync.close()
+            if result is not None:
+                print(("Success: " if result.ok else "Error: ") + result.message())
+        elif self.auto_sync:
+            self.auto_sync.close()
+
     def start(self):
         # User requested to remove automatic setup.
         # It is now accessible via the Main Menu (Option a).
@@ -722,6 +887,16 @@ class App:
 if __name__ == "__main__":
     # Ensure we are running in the script's directory so relative paths work
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if len(sys.argv) == 3 and sys.argv[1] == "get":
+        sys.exit(0 if App().lookup(sys.argv[2]) else 1)
+    # New device: shallow clone of the synced folder (python main.py clone <url> <folder>)
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "clone":
+        dest = sys.argv[3] if len(sys.argv) == 4 else os.path.splitext(os.path.basename(sys.argv[2].rstrip("/")))[0]
+        sys.exit(0 if GitSync.bootstrap_data(sys.argv[2], dest).ok else 1)
+    if len(sys.argv) == 2 and sys.argv[1] == "compact":
+        app = App()
+        sys.exit(0 if GitSync.compact_data(app.cm.config, app.history_paths()).ok else 1)
     
     # Mode Selection
     print("Select Mode:")
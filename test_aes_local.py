@@ -0,0 +1,68 @@
+import sys
+import os
+
+# Add current directory to path so we can import libs
+sys.path.append(os.getcwd())
+
+from libs import aes
+
+# FIPS-197 Appendix C example vectors
+VECTORS = [
+    ("000102030405060708090a0b0c0d0e0f", "69c4e0d86a7b0430d8cdb78070b4c55a"),
+    ("000102030405060708090a0b0c0d0e0f1011121314151617", "dda97ca4864cdfe06eaf70a0ec0d7191"),
+    ("000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f", "8ea2b7ca516745bfeafc49904b496089"),
+]
+PLAIN = bytes.fromhex("00112233445566778899aabbccddeeff")
+
+def test_engines_match_fips197():
+    print("Testing AES engines against FIPS-197 vectors...")
+    for name in aes.ENGINES:
+        for key_hex, expected in VECTORS:
+            cipher = aes.new(bytes.fromhex(key_hex), engine=name)
+            enc = cipher.encrypt_block(PLAIN)
+            if enc.hex() != expected or cipher.decrypt_block(enc) != PLAIN:
+                print(f"[FAIL] Engine '{name}' mismatch for {len(key_hex) * 4}-bit key.")
+                exit(1)
+    print("[PASS] All engines match the reference vectors.")
+
+def test_engines_agree_on_cbc():
+    print("\nTesting CBC output is identical across engines...")
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(123)
+    outputs = {name: aes.encrypt_cbc(data, key, iv, engine=name) for name in aes.ENGINES}
+    if len(set(outputs.values())) != 1:
+        print("[FAIL] Engines produced different ciphertexts.")
+        exit(1)
+    for name in aes.ENGINES:
+        if aes.decrypt_cbc(outputs[name], key, iv, engine=name) != data:
+            print(f"[FAIL] Engine '{name}' did not round-trip.")
+            exit(1)
+    print("[PASS] CBC round-trip identical for all engines.")
+
+def test_streaming_cbc_chunks():
+    print("\nTesting streaming CBC contexts with uneven chunks...")
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(1000)
+    expected = aes.encrypt_cbc(data, key, iv)
+
+    cbc = aes.CBC(key)
+    for step in (1, 7, 16, 33, 1000):
+        encryptor = cbc.encryptor(iv)
+        parts = [encryptor.update(data[i:i + step]) for i in range(0, len(data), step)]
+        ciphertext = b"".join(parts) + encryptor.finalize()
+
+        decryptor = cbc.decryptor(iv)
+        parts = [decryptor.update(ciphertext[i:i + step]) for i in range(0, len(ciphertext), step)]
+        plain = b"".join(parts) + decryptor.finalize()
+
+        if ciphertext != expected or plain != data:
+            print(f"[FAIL] Chunk size {step} produced a different result.")
+            exit(1)
+    print("[PASS] Streaming output matches one-shot CBC.")
+
+if __name__ == "__main__":
+    test_engines_match_fips197()
+    test_engines_agree_on_cbc()
+    test_streaming_cbc_chunks()
@@ -0,0 +1,90 @@
+import sys
+import os
+
+# Add current directory to path so we can import libs
+sys.path.append(os.getcwd())
+
+from concurrent.futures.process import BrokenProcessPool
+
+from libs import pure_fernet
+from libs.pure_fernet import Fernet, InvalidToken
+
+# Vector from the Fernet specification (generate.json / verify.json)
+SPEC_KEY = "cw_0x689RpI-jtRR7oE8h_eQsKImvJapLeSbXpwF4e4="
+SPEC_TOKEN = "gAAAAAAdwJ6wAAECAwQFBgcICQoLDA0ODy021cpGVWKZ_eEwCGM4BLLF_5CV9dOPmrhuVUPgJobwOz7JcbmrR64jVmpU4IwqDA=="
+
+def test_spec_vector():
+    print("Testing Fernet against the specification vector...")
+    if Fernet(SPEC_KEY).decrypt(SPEC_TOKEN) != b"hello":
+        print("[FAIL] Specification token did not decrypt to 'hello'.")
+        exit(1)
+    print("[PASS] Specification token decrypted.")
+
+def test_round_trip_and_tamper():
+    print("\nTesting Fernet round-trip and tamper detection...")
+    f = Fernet(Fernet.generate_key())
+    for size in (0, 15, 16, 17, 4096):
+        data = os.urandom(size)
+        token = f.encrypt(data)
+        if f.decrypt(token) != data:
+            print(f"[FAIL] Round-trip failed for {size} bytes.")
+            exit(1)
+
+    token = bytearray(f.encrypt(b"secret"))
+    token[-5] = ord("A") if token[-5] != ord("A") else ord("B")
+    try:
+        f.decrypt(bytes(token))
+        print("[FAIL] Tampered token was accepted.")
+        exit(1)
+    except InvalidToken:
+        pass
+    print("[PASS] Round-trip works and tampering is rejected.")
+
+def test_batch_api():
+    print("\nTesting encrypt_many / decrypt_many with a process pool...")
+    f = Fernet(Fernet.generate_key())
+    items = [f"secret-{i}".encode() for i in range(Fernet.parallel_threshold + 10)]
+    tokens = f.encrypt_many(items, workers=2)
+    tokens[5] = b"not-a-token"
+    results = f.decrypt_many(tokens, workers=2)
+
+    if not isinstance(results[5], InvalidToken):
+        print("[FAIL] Bad token was not reported as InvalidToken.")
+        exit(1)
+    if [r for i, r in enumerate(results) if i != 5] != [d for i, d in enumerate(items) if i != 5]:
+        print("[FAIL] Batch results are missing or out of order.")
+        exit(1)
+    print("[PASS] Batch order kept and failure reported per item.")
+
+def test_broken_pool_falls_back():
+    print("\nTesting encrypt_many / decrypt_many when the process pool breaks...")
+    class BrokenPool:
+        def __init__(self, *args, **kwargs):
+            pass
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            return False
+        def map(self, *args):
+            raise BrokenProcessPool("worker died")
+
+    f = Fernet(Fernet.generate_key())
+    items = [f"secret-{i}".encode() for i in range(Fernet.parallel_threshold + 10)]
+    original = pure_fernet.ProcessPoolExecutor
+    pure_fernet.ProcessPoolExecutor = BrokenPool
+    try:
+        tokens = f.encrypt_many(items, workers=2)
+        results = f.decrypt_many(tokens, workers=2)
+    finally:
+        pure_fernet.ProcessPoolExecutor = original
+
+    if results != items:
+        print("[FAIL] Serial fallback did not round-trip the batch.")
+        exit(1)
+    print("[PASS] Broken pool falls back to the serial path.")
+
+if __name__ == "__main__":
+    test_spec_vector()
+    test_round_trip_and_tamper()
+    test_batch_api()
+    test_broken_pool_falls_back()
@@ -0,0 +1,88 @@
+import sys
+import os
+
+# Add current directory to path so we can import libs
+sys.path.append(os.getcwd())
+
+from libs import pure_otp
+
+# RFC 6238 Appendix B secret ("12345678901234567890") in base32
+RFC_SECRET = "GEZDGNBVGY3TQOJQGEZDGNBVGY3TQOJQ"
+
+def test_rfc6238_vectors():
+    print("Testing pure TOTP against RFC 6238 vectors...")
+    totp = pure_otp.TOTP(RFC_SECRET, digits=8)
+    for for_time, expected in ((59, "94287082"), (1111111109, "07081804"), (2000000000, "69279037")):
+        if totp.generate_otp(totp.timecode(for_time)) != expected:
+            print(f"[FAIL] Wrong code at T={for_time}.")
+            exit(1)
+    print("[PASS] RFC 6238 vectors match.")
+
+def test_verifier_window_and_drift():
+    print("\nTesting cached TOTPVerifier...")
+    totp = pure_otp.TOTP(RFC_SECRET)
+    verifier = pure_otp.TOTPVerifier(RFC_SECRET, valid_window=2)
+    now = 1111111109
+    tm = totp.timecode(now)
+    if verifier.verify(totp.generate_otp(tm), for_time=now) != 0:
+        print("[FAIL] Current code not matched with offset 0.")
+        exit(1)
+    if verifier.verify(totp.generate_otp(tm + 2), for_time=now) != 2:
+        print("[FAIL] Drifted code did not report offset +2.")
+        exit(1)
+    if verifier.verify(totp.generate_otp(tm + 3), for_time=now) is not None:
+        print("[FAIL] Code outside the window was accepted.")
+        exit(1)
+    # Next timestep: window slides, offsets are relative to the new step
+    if verifier.verify(totp.generate_otp(tm), for_time=now + 30) != -1:
+        print("[FAIL] Window did not advance with the timestep.")
+        exit(1)
+    print("[PASS] Verifier matches within the window and reports drift.")
+
+def test_drift_calibration():
+    print("\nTesting wide-window clock drift calibration...")
+    totp = pure_otp.TOTP(RFC_SECRET)
+    now = 1111111109
+    tm = totp.timecode(now)
+    # Phone clock runs 2 hours fast: it shows the codes for tm+240, tm+241
+    codes = [totp.generate_otp(tm + 240), totp.generate_otp(tm + 241)]
+    drift = pure_otp.calibrate_drift(RFC_SECRET, codes, for_time=now)
+    if drift != 240:
+        print(f"[FAIL] Expected drift 240, got {drift}.")
+        exit(1)
+
+    verifier = pure_otp.TOTPVerifier(RFC_SECRET, valid_window=1, drift=drift)
+    if verifier.verify(totp.generate_otp(tm + 241), for_time=now) != 241:
+        print("[FAIL] Calibrated verifier did not accept the drifted code.")
+        exit(1)
+    if not totp.verify(codes[0], for_time=now, drift=drift):
+        print("[FAIL] TOTP.verify ignored the drift offset.")
+        exit(1)
+    print("[PASS] Drift found and applied with a small window.")
+
+def test_code_board_batches_per_tick():
+    print("\nTesting multi-account CodeBoard...")
+    accounts = {"GitHub": RFC_SECRET, "Mail": pure_otp.random_base32()}
+    board = pure_otp.CodeBoard(accounts)
+    batches = []
+    board.subscribe(lambda codes, left: batches.append(codes))
+
+    now = 1111111109
+    board.tick(now)
+    board.tick(now + 1) # same timestep: no new batch
+    board.tick(now + 30)
+    if len(batches) != 2:
+        print(f"[FAIL] Expected 2 batches, got {len(batches)}.")
+        exit(1)
+    for name, secret in accounts.items():
+        totp = pure_otp.TOTP(secret)
+        if batches[0][name] != totp.generate_otp(totp.timecode(now)):
+            print(f"[FAIL] Wrong batched code for {name}.")
+            exit(1)
+    print("[PASS] One batch per tick with correct codes.")
+
+if __name__ == "__main__":
+    test_rfc6238_vectors()
+    test_verifier_window_and_drift()
+    test_drift_calibration()
+    test_code_board_batches_per_tick()
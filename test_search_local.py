@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add current directory to path so we can import libs
+sys.path.append(os.getcwd())
+
+from libs import search
+
+def test_substring_and_ranking():
+    print("Testing trigram substring search and ranking...")
+    index = search.TrigramIndex(["GitHub", "GitLab", "my github mirror", "Mail", "Gmail", "Bank"])
+    results = index.search("github", fuzzy=False)
+    if results != ["GitHub", "my github mirror"]:
+        print(f"[FAIL] Unexpected substring results: {results}")
+        exit(1)
+    if sorted(index.search("ai", fuzzy=False)) != ["Gmail", "Mail"]:
+        print("[FAIL] Short query not matched.")
+        exit(1)
+    if index.search("zzz") != []:
+        print("[FAIL] Unrelated query returned results.")
+        exit(1)
+    print("[PASS] Substring matches are exact and ranked.")
+
+def test_fuzzy_and_updates():
+    print("\nTesting fuzzy search and incremental updates...")
+    index = search.TrigramIndex(["GitHub", "Mail", "Bank"])
+    if index.search("gihtub")[:1] != ["GitHub"]:
+        print("[FAIL] Typo not tolerated.")
+        exit(1)
+    index.add("Netflix")
+    index.remove("GitHub")
+    if index.search("netflix") != ["Netflix"] or index.search("github"):
+        print("[FAIL] Index not updated on add/remove.")
+        exit(1)
+    if "GitHub" in index or len(index) != 3:
+        print("[FAIL] Removed name still indexed.")
+        exit(1)
+    print("[PASS] Typos match and the index follows writes.")
+
+def test_sorted_pages():
+    print("\nTesting sorted name index and paging...")
+    names = search.SortedNames(["b", "C", "a", "e", "D"])
+    if names.page(0, 2) != ["a", "b"] or names.page(2, 2) != ["e"] or names.page_count(2) != 3:
+        print("[FAIL] Pages not sorted case-insensitively.")
+        exit(1)
+    names.add("Ab")
+    names.remove("C")
+    if list(names) != ["a", "Ab", "b", "D", "e"]:
+        print(f"[FAIL] Incremental update broke order: {list(names)}")
+        exit(1)
+    if names.after("Ab", 2) != ["b", "D"] or names.after("e", 2) != []:
+        print("[FAIL] Cursor paging wrong.")
+        exit(1)
+    print("[PASS] Sorted names page by number and by cursor.")
+
+if __name__ == "__main__":
+    test_substring_and_ranking()
+    test_fuzzy_and_updates()
+    test_sorted_pages()
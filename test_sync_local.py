@@ -0,0 +1,352 @@
+import sys
+import os
+import subprocess
+import tempfile
+import time
+
+# Add current directory to path so we can import libs
+sys.path.append(os.getcwd())
+
+from libs import core
+from libs import delta
+from libs import session
+from libs import vault
+from libs.pure_fernet import Fernet
+
+def make_clone(tmp):
+    # A bare "cloud" repo plus a working clone with an identity, like a synced vault folder
+    remote = os.path.join(tmp, "remote.git")
+    work = os.path.join(tmp, "work")
+    subprocess.run(["git", "init", "-q", "--bare", remote], check=True)
+    subprocess.run(["git", "clone", "-q", remote, work], check=True, capture_output=True)
+    subprocess.run(["git", "config", "user.email", "sync@example.com"], cwd=work, check=True)
+    subprocess.run(["git", "config", "user.name", "Sync Test"], cwd=work, check=True)
+    return remote, work
+
+def test_background_push():
+    print("Testing background GitSync runner...")
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = make_clone(tmp)
+        with open(os.path.join(work, "credentials.dat"), "wb") as f:
+            f.write(b"vault")
+
+        runner = core.SyncRunner(cwd=work)
+        if not runner.push() or runner.push():
+            print("[FAIL] Runner did not start once and refuse a second concurrent sync.")
+            exit(1)
+        result = runner.wait(60)
+        events = runner.poll()
+        if not result or not result.ok or events[-1] != ("done", result):
+            print(f"[FAIL] Push failed: {result and result.message()}")
+            exit(1)
+        if not any(kind == "progress" for kind, _ in events):
+            print("[FAIL] No progress events reported.")
+            exit(1)
+        log = subprocess.run(["git", "log", "--oneline"], cwd=remote, capture_output=True, text=True).stdout
+        if "Auto-Sync" not in log:
+            print("[FAIL] Commit did not reach the remote.")
+            exit(1)
+
+        # Another sync (CLI, auto-sync) holds the shared lock: the runner waits for it
+        with core.SYNC_LOCK:
+            runner.pull()
+            if runner.wait(0.5) is not None:
+                print("[FAIL] Runner did not wait for the running sync.")
+                exit(1)
+        if not runner.wait(60).ok:
+            print("[FAIL] Waiting runner did not finish.")
+            exit(1)
+    print("[PASS] Push runs in the background and reports progress.")
+
+def test_failure_is_captured():
+    print("\nTesting sync failure capture...")
+    with tempfile.TemporaryDirectory() as tmp:
+        runner = core.SyncRunner(cwd=tmp) # not a git repository
+        runner.pull()
+        result = runner.wait(60)
+        if result.ok or result.returncode == 0 or not result.stderr or result.step != "pull":
+            print("[FAIL] Exit code and stderr not captured.")
+            exit(1)
+    print("[PASS] Failed syncs report exit code and stderr.")
+
+def test_change_aware_push():
+    print("\nTesting change-aware push...")
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = make_clone(tmp)
+        for name in ("credentials.dat", "pm_config.json", "notes.txt"):
+            with open(os.path.join(work, name), "w") as f:
+                f.write(name)
+        paths = ["credentials.dat", "credentials.dat.shards"]
+        watch = ["pm_config.json"]
+
+        def commits():
+            return subprocess.run(["git", "rev-list", "--all", "--count"], cwd=remote, capture_output=True, text=True).stdout.strip()
+
+        first = core.GitSync.push(cwd=work, paths=paths, watch=watch)
+        tracked = subprocess.run(["git", "ls-files"], cwd=work, capture_output=True, text=True).stdout.split()
+        if not first.ok or tracked != ["credentials.dat"]:
+            print(f"[FAIL] Expected only vault paths staged, got {tracked}.")
+            exit(1)
+        second = core.GitSync.push(cwd=work, paths=paths, watch=watch)
+        if not second.skipped or commits() != "1":
+            print("[FAIL] Unchanged vault was committed again.")
+            exit(1)
+        with open(os.path.join(work, "pm_config.json"), "w") as f:
+            f.write("new otp_secret")
+        config_only = core.GitSync.push(cwd=work, paths=paths, watch=watch)
+        if config_only.skipped or not config_only.ok or commits() != "1":
+            print("[FAIL] Config change was not detected, or was committed.")
+            exit(1)
+        with open(os.path.join(work, "credentials.dat"), "w") as f:
+            f.write("changed")
+        third = core.GitSync.push(cwd=work, paths=paths, watch=watch)
+        if third.skipped or not third.ok or commits() != "2":
+            print("[FAIL] Changed vault was not pushed.")
+            exit(1)
+    print("[PASS] Only vault paths are staged, the config is watched, no-op syncs are skipped.")
+
+def test_pull_keeps_local_edits():
+    print("\nTesting that a pull does not mark unpushed edits as synced...")
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = make_clone(tmp)
+        paths = ["credentials.dat", "credentials.dat.shards"]
+        with open(os.path.join(work, "credentials.dat"), "w") as f:
+            f.write("vault 1")
+        if not core.GitSync.push(cwd=work, paths=paths).ok:
+            print("[FAIL] First push failed.")
+            exit(1)
+        with open(os.path.join(work, "credentials.dat"), "w") as f:
+            f.write("vault 2")
+        if not core.GitSync.pull(cwd=work, paths=paths).ok:
+            print("[FAIL] Pull failed.")
+            exit(1)
+        second = core.GitSync.push(cwd=work, paths=paths)
+        pushed = subprocess.run(["git", "show", "HEAD:credentials.dat"], cwd=remote, capture_output=True, text=True).stdout
+        if second.skipped or not second.ok or pushed != "vault 2":
+            print("[FAIL] Edit made before the pull never reached the remote.")
+            exit(1)
+    print("[PASS] Edits made before a pull are still pushed.")
+
+def test_push_stages_only_existing_vault():
+    print("\nTesting that push never falls back to staging the whole tree...")
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = make_clone(tmp)
+        with open(os.path.join(work, "exported_credentials.csv"), "w") as f:
+            f.write("service,password")
+        result = core.GitSync.push(cwd=work, paths=["credentials.dat", "credentials.dat.shards"])
+        tracked = subprocess.run(["git", "ls-files"], cwd=work, capture_output=True, text=True).stdout.split()
+        if result.ok or tracked:
+            print(f"[FAIL] Push without a vault staged {tracked}.")
+            exit(1)
+
+        # New device: the configured folder is missing, the vault sits next to the app
+        cm = core.ConfigManager(os.path.join(tmp, "pm_config.json"))
+        cm.config = {"data_path": os.path.join("missing", "credentials.dat")}
+        cwd = os.getcwd()
+        os.chdir(work)
+        try:
+            with open("credentials.dat", "w") as f:
+                f.write("vault")
+            paths = cm.sync_paths()
+        finally:
+            os.chdir(cwd)
+        if paths[0] != "credentials.dat" or not core.GitSync.push(cwd=work, paths=paths).ok:
+            print(f"[FAIL] The local vault copy was not synced: {paths}.")
+            exit(1)
+    print("[PASS] Only existing vault files are staged, including the local fallback.")
+
+def test_pull_flushes_write_behind():
+    print("\nTesting that a pull never lets buffered writes overwrite pulled data...")
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, laptop = make_clone(tmp)
+        paths = ["credentials.dat", "credentials.dat.shards"]
+        laptop_vault = os.path.join(laptop, "credentials.dat")
+        vault.open_vault(laptop_vault, fernet).save({"base": "0"})
+        core.GitSync.push(cwd=laptop, paths=paths)
+        phone = os.path.join(tmp, "phone")
+        subprocess.run(["git", "clone", "-q", remote, phone], check=True, capture_output=True)
+        subprocess.run(["git", "config", "user.email", "sync@example.com"], cwd=phone, check=True)
+        subprocess.run(["git", "config", "user.name", "Sync Test"], cwd=phone, check=True)
+        phone_vault = os.path.join(phone, "credentials.dat")
+        vault.open_vault(phone_vault, fernet).save({"base": "0", "remote": "1"})
+        core.GitSync.push(cwd=phone, paths=paths)
+
+        store = vault.BufferedVault(vault.open_vault(laptop_vault, fernet), 60)
+        vault_session = session.VaultSession(store)
+        vault_session.unlock()
+        vault_session.put("local", "2") # still only in the write-behind journal
+        result = core.GitSync.pull(cwd=laptop, paths=paths)
+        vault_session.lock() # what the GUI/webapp do before reopening after a pull
+        data = vault.open_vault(laptop_vault, fernet).load()
+        if "local" not in data or (result.ok and "remote" not in data):
+            print(f"[FAIL] Pull result {result.ok} left {sorted(data)} on disk.")
+            exit(1)
+    print("[PASS] Buffered writes reach the disk before git pulls.")
+
+def test_auto_sync_batches_and_retries():
+    print("\nTesting coalescing auto-sync scheduler...")
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = make_clone(tmp)
+        vault_file = os.path.join(work, "credentials.dat")
+        sync = core.AutoSync([vault_file], quiet=0.3, retry=0.2, max_backoff=1, cwd=work)
+        for i in range(5):
+            with open(vault_file, "w") as f:
+                f.write(f"save {i}")
+            sync.notify()
+        time.sleep(1.5)
+        count = subprocess.run(["git", "rev-list", "--all", "--count"], cwd=remote, capture_output=True, text=True).stdout.strip()
+        if count != "1" or sync.pending():
+            print(f"[FAIL] Expected one batched commit, remote has {count}.")
+            exit(1)
+
+        # Offline: the push fails, stays pending and is retried with backoff
+        subprocess.run(["git", "remote", "set-url", "origin", os.path.join(tmp, "missing.git")], cwd=work, check=True)
+        with open(vault_file, "w") as f:
+            f.write("offline edit")
+        sync.notify()
+        time.sleep(1.2)
+        if not sync.pending() or sync._failures < 2:
+            print("[FAIL] Failed push was not retried.")
+            exit(1)
+        subprocess.run(["git", "remote", "set-url", "origin", remote], cwd=work, check=True)
+        result = sync.close()
+        if not result or not result.ok or sync.pending():
+            print("[FAIL] close() did not flush the pending change.")
+            exit(1)
+    print("[PASS] Saves batch into one push, retries back off, close flushes.")
+
+def test_delta_sync_merges_records():
+    print("\nTesting record-level delta sync between two devices...")
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, laptop = make_clone(tmp)
+        phone = os.path.join(tmp, "phone")
+        subprocess.run(["git", "clone", "-q", remote, phone], check=True, capture_output=True)
+        subprocess.run(["git", "config", "user.email", "sync@example.com"], cwd=phone, check=True)
+        subprocess.run(["git", "config", "user.name", "Sync Test"], cwd=phone, check=True)
+
+        def device(work):
+            path = os.path.join(work, "credentials.dat")
+            return path, delta.DeltaSync(lambda: vault.open_vault(path, fernet, "log"), fernet, repo_dir=work)
+
+        laptop_vault, laptop_sync = device(laptop)
+        laptop_auto = device(laptop)[1] # a second instance on the same state (auto-sync)
+        vault.open_vault(laptop_vault, fernet, "log").save({"GitHub": "one", "Mail": "one", "Bank": "one"})
+        if not laptop_sync.push().ok:
+            print("[FAIL] First delta push failed.")
+            exit(1)
+        phone_vault, phone_sync = device(phone)
+        if not phone_sync.pull().ok or vault.open_vault(phone_vault, fernet).load() != {"GitHub": "one", "Mail": "one", "Bank": "one"}:
+            print("[FAIL] Second device did not receive the records.")
+            exit(1)
+
+        # Concurrent edits through the app's session: different services on each
+        # device, and both edit Mail. The laptop edits first but syncs last.
+        def edit(path, sync, updates, deletes=()):
+            store = session.VaultSession(vault.open_vault(path, fernet, "log"), on_change=sync.touch)
+            store.unlock()
+            store.put_many(updates)
+            for name in deletes:
+                store.delete(name)
+            store.lock()
+
+        edit(laptop_vault, laptop_auto, {"GitHub": "laptop", "Mail": "laptop"})
+        time.sleep(0.01)
+        edit(phone_vault, phone_sync, {"Mail": "phone"}, ["Bank"])
+        if not phone_sync.push().ok or not laptop_sync.pull().ok or not laptop_auto.push().ok or not phone_sync.pull().ok:
+            print("[FAIL] Concurrent delta sync failed.")
+            exit(1)
+        folders = os.listdir(os.path.join(laptop, "changes"))
+        own = [f for f in folders if f == laptop_sync.state["device"]]
+        if len(own) != 1 or len(os.listdir(os.path.join(laptop, "changes", own[0]))) != 2:
+            print("[FAIL] Instances sharing a state file reused a device id or sequence number.")
+            exit(1)
+        expected = {"GitHub": "laptop", "Mail": "phone"}
+        for path in (laptop_vault, phone_vault):
+            merged = vault.open_vault(path, fernet).load()
+            if merged != expected:
+                print(f"[FAIL] Last writer did not win: {merged}")
+                exit(1)
+        tracked = subprocess.run(["git", "ls-files"], cwd=laptop, capture_output=True, text=True).stdout.split()
+        if not tracked or not all(name.startswith("changes/") and name.endswith(".cs") for name in tracked):
+            print(f"[FAIL] Expected only change sets committed, got {tracked}.")
+            exit(1)
+    print("[PASS] Change sets merge per record with last-writer-wins.")
+
+def test_compact_and_shallow_clone():
+    print("\nTesting sync history compaction and shallow bootstrap...")
+    with tempfile.TemporaryDirectory() as tmp:
+        remote, work = make_clone(tmp)
+        now = time.time()
+        # One sync a day for 90 days, with a source change on day 60
+        def commit(name, content, message, day, author="Sync Test"):
+            with open(os.path.join(work, name), "w") as f:
+                f.write(content)
+            date = f"{int(now - day * 86400)} +0000"
+            env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date, GIT_AUTHOR_NAME=author)
+            subprocess.run(["git", "add", name], cwd=work, check=True)
+            subprocess.run(["git", "commit", "-q", "-m", message], cwd=work, check=True, env=env)
+
+        for day in range(90, -1, -1):
+            if day == 60:
+                commit("main.py", "code", "Add a feature\n\nWith a body.", day, author="Dev")
+            else:
+                commit("credentials.dat", f"vault {day}", f"Auto-Sync: day {day}\n\nDevice: laptop", day, author="Laptop")
+        subprocess.run(["git", "push", "-q", "origin", "HEAD"], cwd=work, check=True, capture_output=True)
+        tree = subprocess.run(["git", "rev-parse", "HEAD^{tree}"], cwd=work, capture_output=True, text=True).stdout
+        with open(os.path.join(work, "main.py"), "w") as f:
+            f.write("unfinished local work")
+        subprocess.run(["git", "stash", "-q"], cwd=work, check=True)
+        feature = subprocess.run(["git", "log", "-1", "--format=%H", "--grep=Add a feature"], cwd=work, capture_output=True, text=True).stdout.strip()
+
+        def compact():
+            return core.GitSync.compact(cwd=work, paths=["credentials.dat", "credentials.dat.shards"],
+                                        keep_days=10, checkpoint_days=30, keep_checkpoints=2, now=now)
+
+        result = compact()
+        if not result.ok or result.skipped:
+            print(f"[FAIL] Compaction failed: {result.message()}")
+            exit(1)
+        count = subprocess.run(["git", "rev-list", "--all", "--count"], cwd=remote, capture_output=True, text=True).stdout.strip()
+        if count != "43": # days 90-60 untouched, then 2 monthly checkpoints and the last 10 days
+            print(f"[FAIL] Expected 43 commits on the remote, got {count}.")
+            exit(1)
+        if subprocess.run(["git", "rev-parse", "HEAD^{tree}"], cwd=work, capture_output=True, text=True).stdout != tree:
+            print("[FAIL] Compaction changed the current snapshot.")
+            exit(1)
+        ancestor = subprocess.run(["git", "merge-base", "--is-ancestor", feature, "HEAD"], cwd=work).returncode
+        latest = subprocess.run(["git", "log", "-1", "--format=%an|%B"], cwd=work, capture_output=True, text=True).stdout.strip()
+        if ancestor != 0 or latest != "Laptop|Auto-Sync: day 0\n\nDevice: laptop":
+            print(f"[FAIL] Source commit rewritten or author/message lost: {latest!r}")
+            exit(1)
+        stashes = subprocess.run(["git", "stash", "list"], cwd=work, capture_output=True, text=True).stdout.splitlines()
+        if len(stashes) != 1:
+            print("[FAIL] Compaction dropped the user's stash.")
+            exit(1)
+        if not compact().skipped:
+            print("[FAIL] Second compaction was not a no-op.")
+            exit(1)
+
+        device = os.path.join(tmp, "device")
+        if not core.GitSync.bootstrap(remote, device).ok:
+            print("[FAIL] Bootstrap clone failed.")
+            exit(1)
+        shallow = subprocess.run(["git", "rev-parse", "--is-shallow-repository"], cwd=device, capture_output=True, text=True).stdout.strip()
+        with open(os.path.join(device, "credentials.dat")) as f:
+            content = f.read()
+        if shallow != "true" or content != "vault 0":
+            print("[FAIL] Bootstrap is not a shallow clone of the latest vault.")
+            exit(1)
+    print("[PASS] Old syncs squash into checkpoints and new devices clone shallow.")
+
+if __name__ == "__main__":
+    test_background_push()
+    test_failure_is_captured()
+    test_change_aware_push()
+    test_pull_keeps_local_edits()
+    test_push_stages_only_existing_vault()
+    test_pull_flushes_write_behind()
+    test_auto_sync_batches_and_retries()
+    test_delta_sync_merges_records()
+    test_compact_and_shallow_clone()
@@ -0,0 +1,427 @@
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path so we can import libs
+sys.path.append(os.getcwd())
+
+from libs.pure_fernet import Fernet
+from libs import session
+from libs import serialize
+from libs import vault
+
+def test_binary_format_and_conversion():
+    print("Testing binary vault format and in-place conversion...")
+    fernet = Fernet(Fernet.generate_key())
+    creds = {"GitHub": "hunter2", "Mail": "p@ss"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        legacy = vault.Vault(path, fernet)
+        legacy.save(creds)
+        legacy_size = os.path.getsize(path)
+        if legacy.stored_format() != "base64":
+            print("[FAIL] Legacy vault not detected as base64.")
+            exit(1)
+
+        # A vault configured for binary still reads the legacy file
+        store = vault.Vault(path, fernet, "binary")
+        if store.load() != creds:
+            print("[FAIL] Legacy vault not readable with binary setting.")
+            exit(1)
+
+        store.convert("binary")
+        if store.stored_format() != "binary" or os.path.getsize(path) >= legacy_size:
+            print("[FAIL] Conversion did not produce a smaller binary vault.")
+            exit(1)
+        if vault.Vault(path, fernet).load() != creds:
+            print("[FAIL] Converted vault lost data.")
+            exit(1)
+    print("[PASS] Binary vault round-trips and legacy files convert.")
+
+def test_session_ttl():
+    print("\nTesting in-memory vault session and idle TTL...")
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        store = vault.Vault(os.path.join(tmp, "credentials.dat"), fernet)
+        store.save({"GitHub": "hunter2"})
+
+        vault_session = session.VaultSession(store, ttl=0.2)
+        vault_session.unlock()
+        data = vault_session.data
+        vault_session.put("Mail", "p@ss")
+        if store.load() != {"GitHub": "hunter2", "Mail": "p@ss"}:
+            print("[FAIL] Session write was not persisted.")
+            exit(1)
+
+        time.sleep(0.5)
+        if vault_session.is_unlocked() or data:
+            print("[FAIL] Session was not wiped after the TTL.")
+            exit(1)
+        if vault_session.put("Other", "x"):
+            print("[FAIL] Locked session accepted a write.")
+            exit(1)
+    print("[PASS] Session persists writes and locks after the TTL.")
+
+def test_append_only_log():
+    print("\nTesting append-only record log vault...")
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        vault.Vault(path, fernet).save({"GitHub": "hunter2"})
+
+        # Legacy blob is converted on first write, then writes only append
+        log = vault.open_vault(path, fernet, "log")
+        vault_session = session.VaultSession(log)
+        vault_session.unlock()
+        vault_session.put("Mail", "p@ss")
+        size = os.path.getsize(path)
+        vault_session.put("Bank", "1234")
+        vault_session.delete("GitHub")
+        if vault.detect_format(log.read_blob()) != "log" or os.path.getsize(path) <= size:
+            print("[FAIL] Writes did not append records.")
+            exit(1)
+
+        # A torn record at the end is ignored and overwritten by the next append
+        with open(path, 'ab') as f:
+            f.write(b"\x00\x00\x01\x00partial")
+        reopened = vault.open_vault(path, fernet, "log")
+        data = reopened.load()
+        reopened.apply(dict(data, Extra="x"), updates=["Extra"])
+        if vault.Vault(path, fernet).load() != {"Mail": "p@ss", "Bank": "1234", "Extra": "x"}:
+            print("[FAIL] Log replay returned the wrong credentials.")
+            exit(1)
+
+        reopened.compact()
+        if len(list(vault.iter_log(reopened.read_blob()))) != 3:
+            print("[FAIL] Compaction did not drop dead records.")
+            exit(1)
+
+        # A second writer appends and compacts behind this instance's back
+        other = vault.open_vault(path, fernet, "log")
+        data = other.load()
+        other.apply(dict(data, Mail="new"), updates=["Mail"])
+        reopened.apply({"Bank": "4321"}, updates=["Bank"])
+        if vault.Vault(path, fernet).load() != {"Mail": "new", "Bank": "4321", "Extra": "x"}:
+            print("[FAIL] Append cut off records written by another instance.")
+            exit(1)
+        other.compact()
+        reopened.apply({"Extra": "y"}, updates=["Extra"])
+        if vault.Vault(path, fernet).load() != {"Mail": "new", "Bank": "4321", "Extra": "y"}:
+            print("[FAIL] Append after a compaction elsewhere corrupted the log.")
+            exit(1)
+    print("[PASS] Log appends, replays, survives a torn tail and compacts.")
+
+def test_indexed_single_entry_reads():
+    print("\nTesting mmap offset index for single-entry reads...")
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        vault.open_vault(path, fernet, "log").save({"GitHub": "hunter2", "Mail": "p@ss"})
+
+        store = vault.open_vault(path, fernet, "log")
+        vault_session = session.VaultSession(store)
+        vault_session.unlock()
+        creds = vault_session.data
+        if sorted(creds) != ["GitHub", "Mail"] or creds._values:
+            print("[FAIL] Listing names decrypted secrets.")
+            exit(1)
+        if creds["Mail"] != "p@ss" or list(creds._values) != ["Mail"]:
+            print("[FAIL] Single read did not decrypt exactly one record.")
+            exit(1)
+        vault_session.put("Bank", "1234")
+        vault_session.lock()
+
+        # Log changed behind the index's back (e.g. git pull): index is rebuilt
+        other = vault.open_vault(path, fernet, "log")
+        other.load()
+        other.apply({"GitHub": "hunter2", "Mail": "p@ss", "Bank": "1234", "New": "x"}, updates=["New"])
+        os.remove(path + ".idx")
+        if vault.open_vault(path, fernet, "log").get("New") != "x":
+            print("[FAIL] Missing index was not rebuilt.")
+            exit(1)
+    print("[PASS] Names come from the index and reveals decrypt one record.")
+
+def test_blind_index_lookup():
+    print("\nTesting blind-index exact lookups...")
+    key = Fernet.generate_key()
+    fernet = Fernet(key)
+    blind_key = vault.derive_blind_key(key)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        creds = {"GitHub": "hunter2", "Mail": "p@ss", "Bank": "1234"}
+        store = vault.open_vault(path, fernet, "log", blind_key)
+        store.save(creds)
+        creds["Mail"] = "new"
+        del creds["Bank"]
+        store.apply(creds, updates=["Mail"], deletes=["Bank"])
+        store.close()
+        with open(path, 'rb') as f:
+            if b"GitHub" in f.read():
+                print("[FAIL] Service name readable on disk.")
+                exit(1)
+
+        # Only the matching record is decrypted: no names, no offset index
+        decrypted = []
+        original = vault.decrypt_token
+        def counting(fernet, token):
+            decrypted.append(len(token))
+            return original(fernet, token)
+        vault.decrypt_token = counting
+        try:
+            store = vault.open_vault(path, fernet, "log", blind_key)
+            found = store.lookup("Mail")
+            missing = store.lookup("Bank")
+            store.close()
+        finally:
+            vault.decrypt_token = original
+        if found != "new" or missing is not None or len(decrypted) != 2:
+            print("[FAIL] Lookup returned wrong value or decrypted extra records.")
+            exit(1)
+
+        # Version 1 logs (no tags) are still read and upgraded on the next write
+        legacy = os.path.join(tmp, "legacy.dat")
+        token = vault.encrypt_token(fernet, b'{"k": "Old", "v": "pw", "t": 0}', "binary")
+        with open(legacy, 'wb') as f:
+            f.write(b"CMLOG\x01" + vault._LEN.pack(len(token)) + token)
+        store = vault.open_vault(legacy, fernet, "log", blind_key)
+        data = store.load()
+        if store.lookup("Old") != "pw":
+            print("[FAIL] Version 1 log not readable.")
+            exit(1)
+        data["Next"] = "pw2"
+        store.apply(data, updates=["Next"])
+        store.close()
+        if vault.open_vault(legacy, fernet, "log", blind_key).lookup("Old") != "pw":
+            print("[FAIL] Version 1 log not upgraded to tagged records.")
+            exit(1)
+    print("[PASS] Exact lookups decrypt one record and names stay hidden.")
+
+def test_write_behind():
+    print("\nTesting write-behind buffer and journal recovery...")
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        inner = vault.open_vault(path, fernet, "binary")
+        writes = []
+        original_save = inner.save
+        inner.save = lambda data: (writes.append(dict(data)), original_save(data))
+        vault_session = session.VaultSession(vault.BufferedVault(inner, 60))
+        vault_session.unlock()
+        for i in range(10):
+            vault_session.put(f"svc{i}", str(i))
+        vault_session.delete("svc0")
+        if writes or not os.path.exists(vault.journal_path(path)):
+            print("[FAIL] Writes were not buffered in the journal.")
+            exit(1)
+        vault_session.lock()
+        if len(writes) != 1 or os.path.exists(vault.journal_path(path)):
+            print("[FAIL] Buffered writes not coalesced into one rewrite.")
+            exit(1)
+        if len(vault.open_vault(path, fernet).load()) != 9:
+            print("[FAIL] Flushed vault lost data.")
+            exit(1)
+
+        # Crash: journal written, vault never flushed. The next open replays it.
+        buffered = vault.BufferedVault(vault.open_vault(path, fernet, "binary"), 60)
+        data = buffered.load()
+        data["Crash"] = "saved"
+        buffered.apply(data, updates=["Crash"])
+        # As if this process died: no timer, no exit flush
+        buffered._timer.cancel()
+        buffered._dirty.clear()
+        vault._buffered.clear()
+        vault.open_vault(path, fernet, "binary", write=False).load()
+        if not os.path.exists(vault.journal_path(path)):
+            print("[FAIL] Read-only open consumed the journal.")
+            exit(1)
+        if vault.open_vault(path, fernet, "binary").load().get("Crash") != "saved":
+            print("[FAIL] Journal not replayed after a crash.")
+            exit(1)
+        if os.path.exists(vault.journal_path(path)):
+            print("[FAIL] Journal left behind after recovery.")
+            exit(1)
+    print("[PASS] Rapid writes coalesce and the journal survives a crash.")
+
+def test_compressed_payload():
+    print("\nTesting compressed vault payloads...")
+    fernet = Fernet(Fernet.generate_key())
+    creds = {f"service-{i}.example.com": f"password-{i}" for i in range(200)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        vault.Vault(path, fernet, "binary").save(creds)
+        plain_size = os.path.getsize(path)
+        for codec in ("zlib", "lzma"):
+            if codec == "lzma" and vault.lzma is None:
+                continue
+            vault.Vault(path, fernet, "binary", compression=codec, level=9).save(creds)
+            if os.path.getsize(path) >= plain_size // 2:
+                print(f"[FAIL] {codec} payload not smaller.")
+                exit(1)
+            # Readers need no compression setting
+            if vault.Vault(path, fernet).load() != creds:
+                print(f"[FAIL] {codec} payload did not round-trip.")
+                exit(1)
+        try:
+            vault.decompress_payload(vault.PAYLOAD_MAGIC + b"\x09\x01")
+            print("[FAIL] Unknown payload version accepted.")
+            exit(1)
+        except ValueError:
+            pass
+    print("[PASS] Compressed payloads shrink the vault and read back transparently.")
+
+def test_binary_serialization():
+    print("\nTesting compact binary serialization...")
+    creds = {f"service-{i}": "shared" if i % 2 else f"pässword-{i}" for i in range(50)}
+    for table in (False, True, None):
+        blob = serialize.dumps(creds, table)
+        if not serialize.is_binary(blob) or serialize.loads(blob) != creds:
+            print(f"[FAIL] Binary round-trip failed (string_table={table}).")
+            exit(1)
+    if len(serialize.dumps(creds, True)) >= len(serialize.dumps(creds, False)):
+        print("[FAIL] String table did not shrink repeated values.")
+        exit(1)
+    if serialize.dumps({"a": [1]}) != b'{"a": [1]}':
+        print("[FAIL] Non-string values should fall back to JSON.")
+        exit(1)
+
+    fernet = Fernet(Fernet.generate_key())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        vault.Vault(path, fernet, "binary").save(creds)
+        json_size = os.path.getsize(path)
+        store = vault.Vault(path, fernet, "binary", serialization="binary", compression="zlib")
+        if store.load() != creds:
+            print("[FAIL] JSON vault not readable with binary serialization set.")
+            exit(1)
+        store.save(creds)
+        if os.path.getsize(path) >= json_size or vault.Vault(path, fernet).load() != creds:
+            print("[FAIL] Binary serialized vault not smaller or not readable.")
+            exit(1)
+    print("[PASS] Binary payloads round-trip and JSON stays readable.")
+
+def test_sharded_vault():
+    print("\nTesting sharded vault...")
+    fernet = Fernet(Fernet.generate_key())
+    creds = {f"service-{i}": f"pw-{i}" for i in range(40)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        vault.Vault(path, fernet, "binary").save(creds)
+        store = vault.open_vault(path, fernet, "sharded", shards=8)
+        store.convert("sharded")
+        if store.stored_format() != "sharded" or store.load() != creds:
+            print("[FAIL] Conversion to shards lost data.")
+            exit(1)
+
+        def snapshot():
+            return {name: open(os.path.join(store.shard_dir, name), 'rb').read() for name in os.listdir(store.shard_dir)}
+        before = snapshot()
+        creds["service-3"] = "changed"
+        store.apply(creds, updates=["service-3"])
+        after = snapshot()
+        changed = [name for name in after if after[name] != before.get(name)]
+        if changed != [f"{vault.shard_of('service-3', 8):02d}.dat"]:
+            print(f"[FAIL] Expected one rewritten shard, got {changed}.")
+            exit(1)
+        if store.get("service-3") != "changed" or vault.Vault(path, fernet).load() != creds:
+            print("[FAIL] Sharded vault not readable after a write.")
+            exit(1)
+
+        # A lost or stale shard file is an error, not a shard without credentials
+        victim = store.shard_path(vault.shard_of("service-3", 8))
+        os.rename(victim, victim + ".bak")
+        try:
+            vault.open_vault(path, fernet, "sharded").load()
+            print("[FAIL] Missing shard loaded as empty.")
+            exit(1)
+        except ValueError:
+            pass
+        with open(victim, 'wb') as f:
+            f.write(before[os.path.basename(victim)])
+        try:
+            vault.open_vault(path, fernet, "sharded").get("service-3")
+            print("[FAIL] Stale shard accepted.")
+            exit(1)
+        except ValueError:
+            pass
+        os.replace(victim + ".bak", victim)
+
+        store.convert("binary")
+        if os.path.exists(store.shard_dir) or vault.Vault(path, fernet).load() != creds:
+            print("[FAIL] Converting away from shards left files or lost data.")
+            exit(1)
+    print("[PASS] Writes rewrite one shard and shards convert both ways.")
+
+def test_split_segments():
+    print("\nTesting split names/secrets segments...")
+    fernet = Fernet(Fernet.generate_key())
+    creds = {"GitHub": "hunter2", "Mail": "p@ss", "Bank": "1234"}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "credentials.dat")
+        vault.Vault(path, fernet, "binary").save(creds)
+        store = vault.open_vault(path, fernet, "split")
+        store.convert("split")
+
+        decrypted = []
+        original = vault.decrypt_token
+        def counting(fernet, token):
+            decrypted.append(len(token))
+            return original(fernet, token)
+        vault.decrypt_token = counting
+        try:
+            vault_session = session.VaultSession(vault.open_vault(path, fernet, "split"))
+            vault_session.unlock()
+            names = vault_session.page(0)
+            listed = len(decrypted)
+            password = vault_session.data["Mail"]
+        finally:
+            vault.decrypt_token = original
+        # One decryption for the metadata segment, one for the revealed password
+        if names != ["Bank", "GitHub", "Mail"] or listed != 1 or password != "p@ss" or len(decrypted) != 2:
+            print("[FAIL] Listing decrypted secrets or reveal decrypted more than one.")
+            exit(1)
+
+        secrets_before = store.read_blob()
+        vault_session.put("Mail", "new")
+        vault_session.lock()
+        store = vault.open_vault(path, fernet, "split")
+        meta = store.metadata()
+        blob = store.read_blob()
+        github = meta["GitHub"]
+        if blob[store._base + github[0]:store._base + github[0] + github[1]] not in secrets_before:
+            print("[FAIL] Unchanged secret was re-encrypted.")
+            exit(1)
+        if vault.Vault(path, fernet).load() != {"GitHub": "hunter2", "Mail": "new", "Bank": "1234"}:
+            print("[FAIL] Split vault lost data.")
+            exit(1)
+
+        # Two secret tokens of the same length swapped on disk
+        store.save({"A": "1111", "B": "2222"})
+        meta = store.metadata()
+        blob = bytearray(store.read_blob())
+        a, b = meta["A"], meta["B"]
+        token_a = blob[store._base + a[0]:store._base + a[0] + a[1]]
+        blob[store._base + a[0]:store._base + a[0] + a[1]] = blob[store._base + b[0]:store._base + b[0] + b[1]]
+        blob[store._base + b[0]:store._base + b[0] + b[1]] = token_a
+        with open(path, 'wb') as f:
+            f.write(blob)
+        try:
+            vault.open_vault(path, fernet, "split").get("A")
+            print("[FAIL] Swapped secret token was accepted.")
+            exit(1)
+        except ValueError:
+            pass
+    print("[PASS] Listing reads only names and writes keep unchanged secrets.")
+
+if __name__ == "__main__":
+    test_binary_format_and_conversion()
+    test_session_ttl()
+    test_append_only_log()
+    test_indexed_single_entry_reads()
+    test_blind_index_lookup()
+    test_write_behind()
+    test_compressed_payload()
+    test_binary_serialization()
+    test_sharded_vault()
+    test_split_segments()
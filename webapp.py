@@ -1,8 +1,8 @@
 import streamlit as st
-import os
-import json
 import time
 from libs import core
+from libs import pure_otp
+from libs import search
 
 # Page Config (Mobile Friendly)
 st.set_page_config(page_title="Brahmos Pass", page_icon="🔒", layout="centered", initial_sidebar_state="collapsed")
@@ -35,6 +35,12 @@ if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
 if 'decrypted_creds' not in st.session_state:
     st.session_state.decrypted_creds = {}
+# Git sync runs on a worker thread; reruns pick up its progress
+if 'sync_runner' not in st.session_state:
+    st.session_state.sync_runner = core.SyncRunner(syncer=st.session_state.cm.syncer())
+    st.session_state.sync_message = ""
+    # Opt-in: saves are batched into one push after a quiet period (runs on a timer thread)
+    st.session_state.auto_sync = core.AutoSync.from_config(st.session_state.cm)
 
 def login():
     st.title("🔒 Login")
@@ -49,14 +55,15 @@ def login():
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Unlock"):
-            secret = st.session_state.cm.config.get("otp_secret")
-            try:
-                import pyotp
-            except ImportError:
-                from libs import pure_otp as pyotp
-                
-            totp = pyotp.TOTP(secret)
-            if totp.verify(code, valid_window=1):
+            # Verifier lives on the session's ConfigManager, so window codes are reused across reruns
+            verifier = st.session_state.cm.otp_verifier()
+            if verifier and verifier.verify(code) is not None:
+                try:
+                    # Decrypted once here; reruns read it from memory until the session idles out
+                    st.session_state.vault_session = st.session_state.cm.open_session(on_change=changed)
+                except Exception:
+                    st.error("Could not decrypt credentials. Check your 'key.key' file.")
+                    return
                 st.session_state.logged_in = True
                 st.success("Unlocked with Biometrics/OTP")
                 st.rerun()
@@ -65,33 +72,84 @@ def login():
     
     with col2:
         if st.button("Sync (Pull)"):
-            with st.status("Syncing..."):
-                core.GitSync.pull_data()
-                st.success("Synced")
+            st.session_state.sync_runner.pull(st.session_state.cm.sync_paths(), st.session_state.cm.watch_paths())
+    sync_status()
+
+def sync_status():
+    # Progress/result of the background sync; the rest of the page stays usable
+    runner = st.session_state.sync_runner
+    for kind, payload in runner.poll():
+        if kind == "progress":
+            st.session_state.sync_message = payload
+        elif kind == "done" and payload.action == "pull" and payload.ok and st.session_state.logged_in:
+            reopen_session() # the vault on disk changed under the open session
+    if runner.busy():
+        st.info(f"⏳ {st.session_state.sync_message or 'Syncing...'}")
+        st.button("Refresh Sync Status")
+    elif runner.result is not None:
+        if runner.result.ok:
+            st.success(runner.result.message())
+        else:
+            st.error(runner.result.message())
+
+def reopen_session():
+    st.session_state.vault_session.lock()
+    st.session_state.vault_session = st.session_state.cm.open_session(on_change=changed)
+
+def changed(names=None):
+    # Session writes: delta sync stamps the edit, auto-sync batches the push
+    st.session_state.cm.record_edit(names)
+    if st.session_state.auto_sync:
+        st.session_state.auto_sync.notify()
 
 def get_credentials():
-    path = st.session_state.cm.config.get("data_path")
-    if not os.path.exists(path):
-        # Fallback check
-        local = os.path.basename(path)
-        if os.path.exists(local): path = local
-        else: return {}
-        
-    with open(path, 'rb') as f:
-        encrypted_data = f.read()
-    try:
-        decrypted = st.session_state.cm.fernet.decrypt(encrypted_data)
-        return json.loads(decrypted)
-    except Exception:
-        return {}
-
-def save_credentials(data):
-    path = st.session_state.cm.config.get("data_path")
-    # Basic path safety/fallback for verification could be added here
-    json_data = json.dumps(data)
-    encrypted = st.session_state.cm.fernet.encrypt(json_data.encode())
-    with open(path, 'wb') as f:
-        f.write(encrypted)
+    return st.session_state.vault_session.data
+
+def authenticator_tab():
+    # One CodeBoard per session: reruns reuse the batch generated for the current tick
+    if 'code_board' not in st.session_state:
+        try:
+            st.session_state.auth_accounts = st.session_state.cm.open_authenticator().load()
+        except Exception:
+            st.error("Could not read authenticator file.")
+            return
+        st.session_state.code_board = pure_otp.CodeBoard(st.session_state.auth_accounts)
+    board = st.session_state.code_board
+    accounts = st.session_state.auth_accounts
+
+    codes = board.codes()
+    st.caption(f"Codes change in {board.seconds_left()}s")
+    if not codes:
+        st.info("No authenticator accounts yet.")
+    for name in board.names():
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.code(f"{codes[name]}   {name}", language=None)
+        with col2:
+            if st.button("Remove", key=f"otp_rm_{name}"):
+                accounts.pop(name, None)
+                board.remove(name)
+                st.session_state.cm.open_authenticator().save(accounts)
+                changed(())
+                st.rerun()
+
+    st.divider()
+    new_name = st.text_input("Account Name", key="otp_new_name")
+    new_secret = st.text_input("Setup Key (base32)", type="password", key="otp_new_secret")
+    if st.button("Add Account"):
+        secret = new_secret.replace(" ", "").upper()
+        if not new_name or not secret:
+            st.error("Fields cannot be empty")
+            return
+        try:
+            board.add(new_name, secret)
+        except Exception:
+            st.error("Invalid setup key")
+            return
+        accounts[new_name] = secret
+        st.session_state.cm.open_authenticator().save(accounts)
+        changed(())
+        st.rerun()
 
 def main_app():
     st.title("🔑 Brahmos Manager")
@@ -100,24 +158,33 @@ def main_app():
     creds = get_credentials()
     
     # Tabs
-    tab1, tab2, tab3 = st.tabs(["Search", "Add New", "Settings"])
+    tab1, tab2, tab4, tab3 = st.tabs(["Search", "Add New", "Authenticator", "Settings"])
     
     with tab1:
         search_term = st.text_input("🔎 Search Services")
         
-        filtered = {k:v for k,v in creds.items() if search_term.lower() in k.lower()} if search_term else creds
+        # Ranked: exact, prefix, substring, then close spellings
+        if search_term:
+            filtered = st.session_state.vault_session.search(search_term)
+        else:
+            # Sorted listing, one page at a time
+            size = st.session_state.cm.config.get("page_size", search.DEFAULT_PAGE_SIZE)
+            pages = st.session_state.vault_session.page_count(size)
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1) if pages > 1 else 1
+            filtered = st.session_state.vault_session.page(int(page) - 1, size)
         
         if not filtered:
             st.info("No credentials found.")
         
-        for service, password in filtered.items():
+        for service in filtered:
             with st.expander(f"🔐 {service}"):
                 # Security Challenge before show? 
                 # On mobile app, usually biometric or just show. 
                 # Let's add a "Reveal" tolerance or button.
                 
                 if st.checkbox(f"Reveal Password for {service}", key=f"rev_{service}"):
-                    st.code(password, language=None)
+                    # Indexed vaults decrypt only this record
+                    st.code(creds[service], language=None)
                 else:
                     st.text("••••••••")
                 
@@ -133,33 +200,37 @@ def main_app():
         
         if st.button("Save Credential"):
             if new_svc and new_pass:
-                creds[new_svc] = new_pass
-                save_credentials(creds)
-                st.success(f"Saved {new_svc}")
-                time.sleep(1)
-                st.rerun()
+                if st.session_state.vault_session.put(new_svc, new_pass):
+                    st.success(f"Saved {new_svc}")
+                    time.sleep(1)
+                    st.rerun()
+                else:
+                    st.error("Session expired. Nothing was saved; please log in again.")
             else:
                 st.error("Fields cannot be empty")
                 
+    with tab4:
+        authenticator_tab()
+
     with tab3:
         st.subheader("Cloud Sync")
         if st.button("☁️ Push Changes to Git"):
-            with st.spinner("Pushing..."):
-                core.GitSync.push_data()
-            st.success("Data Pushed to Cloud")
+            st.session_state.sync_runner.push(st.session_state.cm.sync_paths(), st.session_state.cm.watch_paths())
             
         if st.button("☁️ Pull Changes from Git"):
-            with st.spinner("Pulling..."):
-                core.GitSync.pull_data()
-            st.success("Data Pulled from Cloud")
+            st.session_state.sync_runner.pull(st.session_state.cm.sync_paths(), st.session_state.cm.watch_paths())
+        sync_status()
             
         st.divider()
         if st.button("Logout"):
+            st.session_state.vault_session.lock()
             st.session_state.logged_in = False
             st.rerun()
 
 if __name__ == "__main__":
-    if st.session_state.logged_in:
+    if st.session_state.logged_in and st.session_state.vault_session.is_unlocked():
         main_app()
     else:
+        # Not logged in, or the vault session idled out and was wiped
+        st.session_state.logged_in = False
         login()